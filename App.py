@@ -3,16 +3,15 @@ Streamlit UI for the Forex Trading Bot
 """
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import time
+import queue
 import threading
-from db_config import SessionLocal
-from models import Trade, Signal, DailyInvestment
+from sqlalchemy import select, func
+from db_config import engine, get_session
+from models import Trade, DailyInvestment
 from pages.Settings import load_settings
-import risk_guard
 import config
-import trade_executor
-from bot import TradingBot
+import db_service
+from dashboard_components import load_trade_stats
 
 # Page configuration
 st.set_page_config(
@@ -24,11 +23,9 @@ st.set_page_config(
 
 # Global variables
 bot_instance = None
-bot_thread = None
-stop_bot = threading.Event()
 
 # Styling
-st.markdown("""
+APP_CSS = """
     <style>
     .main-header {
         font-size: 2.5rem;
@@ -57,118 +54,90 @@ st.markdown("""
         color: #616161;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
-@st.cache_data(ttl=10)  # Cache data for 10 seconds
-def load_trade_data():
-    """Load trade data from the database"""
-    db = SessionLocal()
-    try:
-        # Get all trades
-        trades = db.query(Trade).all()
-        # Convert to DataFrame
-        if trades:
-            data = [{
-                "id": t.id,
-                "ticket": t.ticket,
-                "symbol": t.symbol,
-                "type": t.type,
-                "volume": t.volume,
-                "price_open": t.price_open,
-                "price_close": t.price_close,
-                "profit": t.profit,
-                "time_open": t.time_open,
-                "time_close": t.time_close,
-                "is_active": t.is_active
-            } for t in trades]
-            return pd.DataFrame(data)
-        return pd.DataFrame()
-    finally:
-        db.close()
+@st.cache_resource
+def _inject_css():
+    """Emit the dashboard stylesheet (built once per process, replayed on reruns)"""
+    st.markdown(APP_CSS, unsafe_allow_html=True)
+    return True
+
+@st.cache_data(ttl=10, show_spinner=False)  # Cache data for 10 seconds
+def load_cumulative_profit():
+    """Load trade open times with the running profit total, computed by the database"""
+    # The window function builds the prefix sum in the same pass that fetches rows
+    query = select(
+        Trade.time_open,
+        func.sum(Trade.profit).over(order_by=(Trade.time_open, Trade.id)).label("cumulative_profit")
+    ).order_by(Trade.time_open, Trade.id)
+    # Timestamps are stored as naive UTC; parse them once here as tz-aware
+    return pd.read_sql_query(query, engine, parse_dates={"time_open": {"utc": True}})
 
 @st.cache_data(ttl=10)
-def load_signal_data():
-    """Load signal data from the database"""
-    db = SessionLocal()
-    try:
-        # Get all signals
-        signals = db.query(Signal).all()
-        # Convert to DataFrame
-        if signals:
-            data = [{
-                "id": s.id,
-                "symbol": s.symbol,
-                "signal_type": s.signal_type,
-                "confidence": s.confidence,
-                "reason": s.reason,
-                "timestamp": s.time_generated,
-                "executed": s.executed
-            } for s in signals]
-            return pd.DataFrame(data)
-        return pd.DataFrame()
-    finally:
-        db.close()
+def load_active_trades():
+    """Load open trades from the database, newest first"""
+    query = select(
+        Trade.ticket,
+        Trade.symbol,
+        Trade.type,
+        Trade.volume,
+        Trade.price_open,
+        Trade.profit,
+        Trade.time_open
+    ).where(Trade.is_active == True).order_by(Trade.time_open.desc())
+    trades_df = pd.read_sql_query(query, engine, parse_dates={"time_open": {"utc": True}})
+    # Show open times in the user's timezone, converted as one column
+    trades_df['time_open'] = trades_df['time_open'].dt.tz_convert(config.TIMEZONE)
+    return trades_df
+
+@st.cache_data(ttl=10)
+def load_recent_signals(n=10):
+    """Load the n most recent signals from the database"""
+    with get_session() as db:
+        signals = db_service.get_recent_signals(db, n)
+        signals_df = pd.DataFrame.from_records(
+            ((s.symbol, s.signal_type, s.confidence, s.time_generated, s.executed) for s in signals),
+            columns=["symbol", "signal_type", "confidence", "timestamp", "executed"]
+        )
+    # Stored as naive UTC; convert the whole column to the user's timezone at once
+    signals_df['timestamp'] = pd.to_datetime(signals_df['timestamp'], utc=True).dt.tz_convert(config.TIMEZONE)
+    return signals_df
 
 @st.cache_data(ttl=10)
 def load_investment_data():
     """Load daily investment data from the database"""
-    db = SessionLocal()
-    try:
-        # Get all investments
-        investments = db.query(DailyInvestment).all()
-        # Convert to DataFrame
-        if investments:
-            data = [{
-                "id": i.id,
-                "date": i.date,
-                "amount": i.amount
-            } for i in investments]
-            return pd.DataFrame(data)
-        return pd.DataFrame()
-    finally:
-        db.close()
+    query = select(
+        DailyInvestment.id,
+        DailyInvestment.date,
+        DailyInvestment.amount
+    )
+    return pd.read_sql_query(query, engine, parse_dates=["date"])
 
 def calculate_overall_stats():
     """Calculate overall trading statistics"""
-    trades_df = load_trade_data()
-    
-    if trades_df.empty:
-        return {
-            "total_trades": 0,
-            "open_trades": 0,
-            "closed_trades": 0,
-            "total_profit": 0,
-            "win_rate": 0,
-            "avg_profit": 0
-        }
-    
-    open_trades = trades_df[trades_df['is_active'] == True]
-    closed_trades = trades_df[trades_df['is_active'] == False]
+    # Aggregated in SQL and cached, so only a single row comes back
+    stats = load_trade_stats()
     
     # Calculate win rate from closed trades
-    winning_trades = 0
-    if not closed_trades.empty:
-        winning_trades = len(closed_trades[closed_trades['profit'] > 0])
-    
-    win_rate = winning_trades / len(closed_trades) * 100 if len(closed_trades) > 0 else 0
-    
-    # Calculate total profit
-    total_profit = trades_df['profit'].sum()
+    win_rate = stats["winning_trades"] / stats["closed_trades"] * 100 if stats["closed_trades"] > 0 else 0
     
     # Calculate average profit per trade
-    avg_profit = total_profit / len(trades_df) if len(trades_df) > 0 else 0
+    avg_profit = stats["total_profit"] / stats["total_trades"] if stats["total_trades"] > 0 else 0
     
     return {
-        "total_trades": len(trades_df),
-        "open_trades": len(open_trades),
-        "closed_trades": len(closed_trades),
-        "total_profit": total_profit,
+        "total_trades": stats["total_trades"],
+        "open_trades": stats["open_trades"],
+        "closed_trades": stats["closed_trades"],
+        "total_profit": stats["total_profit"],
         "win_rate": win_rate,
         "avg_profit": avg_profit
     }
 
+@st.cache_data(ttl=10)
 def get_daily_investments_chart():
     """Create a chart showing daily investments"""
+    import plotly.graph_objects as go
+    
     investments_df = load_investment_data()
     
     if investments_df.empty:
@@ -210,27 +179,24 @@ def get_daily_investments_chart():
     
     return fig
 
+@st.cache_data(ttl=10)
 def get_profit_chart():
     """Create a chart showing profit over time"""
-    trades_df = load_trade_data()
-    
-    if trades_df.empty:
-        return None
+    import plotly.graph_objects as go
     
-    # Sort by time opened
-    trades_df = trades_df.sort_values('time_open')
+    profit_df = load_cumulative_profit()
     
-    # Convert time_open to datetime
-    trades_df['time_open'] = pd.to_datetime(trades_df['time_open'], dayfirst=True, utc=True).dt.tz_convert(config.TIMEZONE)
+    if profit_df.empty:
+        return None
     
-    # Calculate cumulative profit
-    trades_df['cumulative_profit'] = trades_df['profit'].cumsum()
+    # time_open is already parsed as UTC by the loader, only convert the zone
+    time_open = profit_df['time_open'].dt.tz_convert(config.TIMEZONE)
     
     # Create a line chart using plotly
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=trades_df['time_open'],
-        y=trades_df['cumulative_profit'],
+        x=time_open,
+        y=profit_df['cumulative_profit'],
         mode='lines',
         name='Cumulative Profit',
         line=dict(color='#4CAF50', width=2)
@@ -248,70 +214,107 @@ def get_profit_chart():
     
     return fig
 
-def run_bot_in_thread():
-    """Run the trading bot in a separate thread"""
+class BotControl:
+    """Bot thread handle, its stop event and its status queue.
+    
+    The UI drains status_q on each render instead of the thread writing to
+    st.session_state directly.
+    """
+    def __init__(self):
+        self.status_q = queue.Queue(maxsize=1)
+        self.stop = threading.Event()
+        self.thread = None
+
+@st.cache_resource
+def bot_control():
+    """Cached so every rerun of this script controls the bot thread that is actually running"""
+    return BotControl()
+
+def publish_bot_status(status_q, status):
+    """Replace any unread bot status with the latest one"""
+    try:
+        status_q.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        status_q.put_nowait(status)
+    except queue.Full:
+        pass
+
+def run_bot_in_thread(control):
+    """Run the trading bot in a separate thread, publishing its status to control.status_q"""
+    # Imported here so MT5/Together/DB setup isn't paid on every dashboard render
+    from bot import TradingBot
     global bot_instance
     
     bot_instance = TradingBot()
     
+    status_q = control.status_q
+    # This thread's own stop event, so a later Start can't revive it with clear()
+    stop_event = control.stop
+    
     def bot_thread_function():
         try:
             bot_instance.setup()
             
-            while not stop_bot.is_set():
+            while not stop_event.is_set():
                 try:
-                    # Check for high-risk news events
-                    high_risk = risk_guard.check_news_risk()
+                    # Check news risk and either close or process trades
+                    high_risk = bot_instance.tick()
                     
                     if high_risk:
-                        st.session_state.bot_status = "High risk detected - closing trades"
-                        trade_executor.close_all_trades()
+                        publish_bot_status(status_q, "High risk detected - closing trades")
                     else:
-                        st.session_state.bot_status = "No high risk detected - safe to trade"
-                        # Process trades if no risk detected
-                        bot_instance.trade_manager.process_trades()
+                        publish_bot_status(status_q, "No high risk detected - safe to trade")
                     
-                    # Sleep interval between checks
-                    for _ in range(config.CHECK_INTERVAL_SECONDS):
-                        if stop_bot.is_set():
-                            break
-                        time.sleep(1)
+                    # Sleep interval between checks, waking early if stopped
+                    if stop_event.wait(timeout=config.CHECK_INTERVAL_SECONDS):
+                        break
                         
                 except Exception as e:
-                    st.session_state.bot_status = f"Error: {str(e)}"
-                    time.sleep(10)
+                    publish_bot_status(status_q, f"Error: {str(e)}")
+                    stop_event.wait(timeout=10)
         except Exception as e:
-            st.session_state.bot_status = f"Fatal error: {str(e)}"
+            publish_bot_status(status_q, f"Fatal error: {str(e)}")
     
     return threading.Thread(target=bot_thread_function, daemon=True)
 
 def main():
     """Main function to render the Streamlit UI"""
-    global bot_thread, stop_bot
+    _inject_css()
+    
+    control = bot_control()
     
-    # Initialize session state variables if they don't exist
+    # Initialize session state variables if they don't exist; a new session
+    # may find a bot already started from another one
     if 'bot_running' not in st.session_state:
-        st.session_state.bot_running = False
+        st.session_state.bot_running = control.thread is not None and control.thread.is_alive()
     if 'bot_status' not in st.session_state:
         st.session_state.bot_status = "Bot not running"
     
+    # Pick up the latest status published by the bot thread
+    try:
+        st.session_state.bot_status = control.status_q.get_nowait()
+    except queue.Empty:
+        pass
+    
     # Sidebar
     st.sidebar.markdown("## Bot Controls")
     
     if st.sidebar.button("Start Bot" if not st.session_state.bot_running else "Bot Running", 
                           disabled=st.session_state.bot_running):
         st.session_state.bot_running = True
-        stop_bot.clear()
-        bot_thread = run_bot_in_thread()
-        bot_thread.start()
+        control.stop = threading.Event()
+        control.thread = run_bot_in_thread(control)
+        control.thread.start()
         st.session_state.bot_status = "Bot starting..."
     
     if st.sidebar.button("Stop Bot", disabled=not st.session_state.bot_running):
         if st.session_state.bot_running:
             st.session_state.bot_running = False
-            stop_bot.set()
-            if bot_thread and bot_thread.is_alive():
-                bot_thread.join(timeout=2)
+            control.stop.set()
+            if control.thread and control.thread.is_alive():
+                control.thread.join(timeout=2)
             st.session_state.bot_status = "Bot stopped"
     
     # Bot status indicator
@@ -385,25 +388,17 @@ def main():
     
     # Trades table
     st.markdown("<h2 class='sub-header'>Active Trades</h2>", unsafe_allow_html=True)
-    trades_df = load_trade_data()
-    if not trades_df.empty:
-        active_trades = trades_df[trades_df['is_active'] == True]
-        if not active_trades.empty:
-            st.dataframe(active_trades[["ticket", "symbol", "type", "volume", "price_open", "profit", "time_open"]], 
-                         use_container_width=True, hide_index=True)
-        else:
-            st.info("No active trades")
+    active_trades = load_active_trades()
+    if not active_trades.empty:
+        st.dataframe(active_trades, use_container_width=True, hide_index=True)
     else:
-        st.info("No trade data available")
+        st.info("No active trades")
     
     # Recent signals
     st.markdown("<h2 class='sub-header'>Recent Signals</h2>", unsafe_allow_html=True)
-    signals_df = load_signal_data()
-    if not signals_df.empty:
-        # Show the most recent 10 signals
-        recent_signals = signals_df.sort_values('timestamp', ascending=False).head(10)
-        st.dataframe(recent_signals[["symbol", "signal_type", "confidence", "timestamp", "executed"]], 
-                     use_container_width=True, hide_index=True)
+    recent_signals = load_recent_signals()
+    if not recent_signals.empty:
+        st.dataframe(recent_signals, use_container_width=True, hide_index=True)
     else:
         st.info("No signal data available")
     
@@ -2,26 +2,56 @@
 Main trading bot module that coordinates all other components.
 This module contains the main trading loop and orchestrates the trading process.
 """
-import time
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
 import traceback
+from datetime import datetime, timedelta
 import MetaTrader5 as mt5
 import config
+import llm_client
+import news_fetcher
 import risk_guard
+import signal_engine
 import trade_executor
 import db_service
 from trade_manager import TradeManager
-from market_data import MarketDataCollector
+
+# Set to stop the main loop; waits on it return as soon as it is set
+stop_event = threading.Event()
+
+def configure_logging(level=logging.INFO):
+    """Send log records through a queue so the emitting thread never blocks on I/O"""
+    root = logging.getLogger()
+    if any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+        return
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+    logging.basicConfig(level=level, handlers=[logging.handlers.QueueHandler(log_queue)])
+
+# News calendars change slowly, so the risk check runs less often than trading
+NEWS_CHECK_INTERVAL = timedelta(minutes=30)
 
 class TradingBot:
     def __init__(self):
         """Initialize the trading bot"""
         self.trade_manager = TradeManager()
-        self.market_data = MarketDataCollector()
+        # Share the trade manager's collector so one MT5 session serves both
+        self.market_data = self.trade_manager.market_data
+        # Last news-risk result, reused until the next check is due
+        self.high_risk = False
+        self.next_news_check = datetime.now()
         # Initialize the database
         db_service.init_db()
     
     def setup(self):
         """Setup initial connections and configurations"""
+        configure_logging()
+        
         # Connect to MT5 terminal
         trade_executor.connect_mt5()
         
@@ -30,33 +60,72 @@ class TradingBot:
             print("Warning: DAILY_INVESTMENT_LIMIT not set in config.py. Using default $20")
             config.DAILY_INVESTMENT_LIMIT = 20.0
     
+    def tick(self):
+        """Run one iteration of the trading loop.
+        
+        Returns:
+            bool: True if high risk was detected and trades were closed.
+        """
+        market_state = signal = None
+        
+        # Check for high-risk news events when the check is due
+        if datetime.now() >= self.next_news_check:
+            # Ask the risk and signal questions in one LLM round trip
+            market_state = self.trade_manager.gather_market_state()
+            # A recent signal for the same market state leaves only the risk question
+            signal = signal_engine.cached_signal(*market_state)
+            risk_answer = signal_answer = None
+            if signal is None:
+                try:
+                    risk_answer, signal_answer = llm_client.batch_decide([
+                        risk_guard.build_risk_prompt(news_fetcher.get_latest_headlines()),
+                        signal_engine.build_signal_prompt(*market_state)
+                    ], system_prompt=config.SYSTEM_PROMPT)
+                except Exception as e:
+                    # Fall back to asking each question separately
+                    print(f"Error getting batched LLM decisions: {e}")
+            
+            self.high_risk, positions_changed = risk_guard.check_news_risk(
+                answer=risk_answer, report_changes=True)
+            if positions_changed:
+                # The risk action opened or closed trades, so the snapshot and the
+                # signal built from it are stale; process_trades gathers and asks again
+                market_state = signal = None
+            elif signal_answer is not None:
+                signal = signal_engine.parse_signal(signal_answer)
+                signal_engine.remember_signal(*market_state, signal)
+            self.next_news_check = datetime.now() + NEWS_CHECK_INTERVAL
+        high_risk = self.high_risk
+        
+        if high_risk:
+            print("High risk detected - closing trades")
+            trade_executor.close_all_trades()
+        else:
+            # Process trades if no risk detected
+            self.trade_manager.process_trades(market_state, signal)
+        
+        return high_risk
+    
     def run(self):
         """Run the main trading loop"""
         try:
             # Setup initial connections
             self.setup()
             
-            # Main trading loop
-            while True:
-                try:
-                    # Check for high-risk news events
-                    high_risk = risk_guard.check_news_risk()
-                    
-                    if high_risk:
-                        print("High risk detected - closing trades")
-                        trade_executor.close_all_trades()
-                    else:
-                        # Process trades if no risk detected
-                        self.trade_manager.process_trades()
+            # Main trading loop, on a single MT5 session held for its whole duration
+            with self.market_data:
+                while not stop_event.is_set():
+                    try:
+                        self.tick()
                     
-                    # Sleep interval between checks
-                    print(f"Sleeping for {config.CHECK_INTERVAL_SECONDS} seconds...")
-                    time.sleep(config.CHECK_INTERVAL_SECONDS)
+                        # Sleep interval between checks
+                        print(f"Sleeping for {config.CHECK_INTERVAL_SECONDS} seconds...")
+                        stop_event.wait(timeout=config.CHECK_INTERVAL_SECONDS)
                     
-                except Exception as e:
-                    print(f"Error in trading loop: {e}")
-                    traceback.print_exc()
-                    time.sleep(60)  # Wait a bit longer after an error
+                    except Exception as e:
+                        print(f"Error in trading loop: {e}")
+                        traceback.print_exc()
+                        stop_event.wait(timeout=60)  # Wait a bit longer after an error
                     
         except KeyboardInterrupt:
             print("\nBot stopped by user.")
@@ -4,76 +4,103 @@ This module contains utility functions for creating Streamlit UI components.
 """
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 from config import TIMEZONE
-from models import Trade, Signal, DailyInvestment
-from db_config import SessionLocal
+from models import Signal, DailyInvestment
+from sqlalchemy import text
+from db_config import get_session
+import db_service
 
 
+def _trades_cache_key(trades_df):
+    """
+    Cache key for a trades DataFrame: its columns plus a hash of every row, so a
+    closed trade or a changed type/symbol invalidates the charts
+    """
+    if trades_df.empty:
+        return (tuple(trades_df.columns), 0)
+    return (tuple(trades_df.columns), int(pd.util.hash_pandas_object(trades_df).sum()))
+
+
+# Charts are rebuilt only when the underlying trades change
+CHART_HASH_FUNCS = {pd.DataFrame: _trades_cache_key}
+
+
+@st.cache_data(ttl=10, hash_funcs=CHART_HASH_FUNCS)
 def create_profit_by_pair_chart(trades_df):
     """
     Create a bar chart showing profit by currency pair
     """
+    import plotly.graph_objects as go
+    
     if trades_df.empty:
         return None
     
-    # Group by symbol and sum profit
-    profit_by_pair = trades_df.groupby('symbol')['profit'].sum().reset_index()
+    # Group by symbol and sum profit (observed=True skips unused categories)
+    profit_by_pair = trades_df.groupby('symbol', observed=True, sort=False)['profit'].sum()
+    profits = profit_by_pair.to_numpy()
     
-    # Create bar chart
-    fig = px.bar(
-        profit_by_pair, 
-        x='symbol', 
-        y='profit',
+    # Create bar chart, coloured red to green by profit
+    fig = go.Figure(go.Bar(
+        x=profit_by_pair.index.to_numpy(),
+        y=profits,
+        marker=dict(
+            color=profits,
+            colorscale=['#F44336', '#FFEB3B', '#4CAF50'],  # Red to Green
+            showscale=True
+        )
+    ))
+    
+    fig.update_layout(
         title='Profit by Currency Pair',
-        color='profit',
-        color_continuous_scale=['#F44336', '#FFEB3B', '#4CAF50'],  # Red to Green
-        labels={'symbol': 'Currency Pair', 'profit': 'Profit ($)'}
+        xaxis_title='Currency Pair',
+        yaxis_title='Profit ($)',
+        height=400
     )
-    
-    fig.update_layout(height=400)
     return fig
 
 
+@st.cache_data(ttl=10, hash_funcs=CHART_HASH_FUNCS)
 def create_trade_distribution_chart(trades_df):
     """
     Create a pie chart showing distribution of trades by type (BUY/SELL)
     """
+    import plotly.graph_objects as go
+    
     if trades_df.empty:
         return None
     
     # Count trades by type
-    trade_counts = trades_df['type'].value_counts().reset_index()
-    trade_counts.columns = ['type', 'count']
+    trade_counts = trades_df['type'].value_counts(sort=False)
+    trade_types = trade_counts.index.to_numpy()
+    type_colors = {'BUY': '#4CAF50', 'SELL': '#F44336'}
     
     # Create pie chart
-    fig = px.pie(
-        trade_counts, 
-        values='count', 
-        names='type',
-        title='Trade Distribution (BUY/SELL)',
-        color='type',
-        color_discrete_map={'BUY': '#4CAF50', 'SELL': '#F44336'}
-    )
+    fig = go.Figure(go.Pie(
+        labels=trade_types,
+        values=trade_counts.to_numpy(),
+        marker=dict(colors=[type_colors.get(t) for t in trade_types])
+    ))
     
-    fig.update_layout(height=350)
+    fig.update_layout(title='Trade Distribution (BUY/SELL)', height=350)
     return fig
 
 
+@st.cache_data(ttl=10, hash_funcs=CHART_HASH_FUNCS)
 def create_daily_profit_chart(trades_df):
     """
     Create a bar chart showing daily profit
     """
+    import plotly.express as px
+    
     if trades_df.empty:
         return None
     
-    # Convert time_open to date only
-    trades_df['date'] = pd.to_datetime(trades_df['time_open_raw'], dayfirst=True, utc=True).dt.tz_convert(TIMEZONE).dt.date
+    # Convert time_open to date only (the loader already parsed it as UTC)
+    trade_dates = trades_df['time_open_raw'].dt.tz_convert(TIMEZONE).dt.date.rename('date')
     
     # Group by date and sum profit
-    daily_profit = trades_df.groupby('date')['profit'].sum().reset_index()
+    daily_profit = trades_df.groupby(trade_dates)['profit'].sum().reset_index()
     
     # Create bar chart
     fig = px.bar(
@@ -90,20 +117,21 @@ def create_daily_profit_chart(trades_df):
     return fig
 
 
+@st.cache_data(ttl=10, hash_funcs=CHART_HASH_FUNCS)
 def create_trade_duration_histogram(trades_df):
     """
     Create a histogram showing trade duration for closed trades
     """
+    import plotly.express as px
+    
     # Filter for closed trades
     closed_trades = trades_df[trades_df['is_active'] == False].copy()
     
     if closed_trades.empty:
         return None
     
-    # Calculate duration in hours
-    closed_trades['time_open'] = pd.to_datetime(closed_trades['time_open'])
-    closed_trades['time_close'] = pd.to_datetime(closed_trades['time_close'])
-    closed_trades['duration_hours'] = (closed_trades['time_close'] - closed_trades['time_open']).dt.total_seconds() / 3600
+    # Calculate duration in hours from the already-parsed raw timestamps
+    closed_trades['duration_hours'] = (closed_trades['time_close_raw'] - closed_trades['time_open_raw']).dt.total_seconds() / 3600
     
     # Create histogram
     fig = px.histogram(
@@ -118,106 +146,114 @@ def create_trade_duration_histogram(trades_df):
     return fig
 
 
+STAT_CARD_CSS = """
+<style>
+.stat-card {
+    background-color: #f0f2f6;
+    border-radius: 10px;
+    padding: 20px;
+    box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+}
+.stat-row {
+    display: flex;
+    justify-content: space-between;
+    margin-bottom: 10px;
+    border-bottom: 1px solid #e0e0e0;
+    padding-bottom: 5px;
+}
+.stat-label {
+    font-weight: 500;
+    color: #424242;
+}
+.stat-value {
+    font-weight: 600;
+    color: #1E88E5;
+}
+.positive-value {
+    color: #4CAF50;
+}
+.negative-value {
+    color: #F44336;
+}
+</style>
+"""
+
+
+@st.cache_resource
+def _inject_stat_card_css():
+    """Emit the stats card stylesheet (built once per process, replayed on reruns)"""
+    st.markdown(STAT_CARD_CSS, unsafe_allow_html=True)
+    return True
+
+
+@st.cache_data(ttl=10)
+def load_trade_stats():
+    """Load aggregate trade statistics, computed in SQL instead of loading every trade"""
+    with get_session() as db:
+        return db_service.get_trade_stats(db)._asdict()
+
+
 def display_trade_stats_card():
     """Display a card with trading statistics"""
-    db = SessionLocal()
-    try:
-        # Get all trades
-        trades = db.query(Trade).all()
-        
-        if not trades:
-            st.info("No trade data available")
-            return
-        
-        # Calculate statistics
-        total_trades = len(trades)
-        active_trades = sum(1 for t in trades if t.is_active)
-        closed_trades = total_trades - active_trades
-        
-        winning_trades = sum(1 for t in trades if not t.is_active and t.profit > 0)
-        losing_trades = sum(1 for t in trades if not t.is_active and t.profit < 0)
-        
-        win_rate = (winning_trades / closed_trades * 100) if closed_trades > 0 else 0
-        
-        total_profit = sum(t.profit for t in trades)
-        avg_profit = total_profit / total_trades if total_trades > 0 else 0
-        
-        # Calculate largest win and loss
-        largest_win = max([t.profit for t in trades if not t.is_active] or [0])
-        largest_loss = min([t.profit for t in trades if not t.is_active] or [0])
-        
-        # Create card
-        st.markdown("""
-        <style>
-        .stat-card {
-            background-color: #f0f2f6;
-            border-radius: 10px;
-            padding: 20px;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }
-        .stat-row {
-            display: flex;
-            justify-content: space-between;
-            margin-bottom: 10px;
-            border-bottom: 1px solid #e0e0e0;
-            padding-bottom: 5px;
-        }
-        .stat-label {
-            font-weight: 500;
-            color: #424242;
-        }
-        .stat-value {
-            font-weight: 600;
-            color: #1E88E5;
-        }
-        .positive-value {
-            color: #4CAF50;
-        }
-        .negative-value {
-            color: #F44336;
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("<div class='stat-card'>", unsafe_allow_html=True)
-        
-        st.markdown("<h3>Trading Performance</h3>", unsafe_allow_html=True)
-        
-        st.markdown(f"""
-        <div class='stat-row'>
-            <span class='stat-label'>Total Trades</span>
-            <span class='stat-value'>{total_trades}</span>
-        </div>
-        <div class='stat-row'>
-            <span class='stat-label'>Win Rate</span>
-            <span class='stat-value'>{win_rate:.2f}%</span>
-        </div>
-        <div class='stat-row'>
-            <span class='stat-label'>Total Profit</span>
-            <span class='stat-value {"positive-value" if total_profit > 0 else "negative-value"}'>
-                ${total_profit:.2f}
-            </span>
-        </div>
-        <div class='stat-row'>
-            <span class='stat-label'>Avg. Profit per Trade</span>
-            <span class='stat-value {"positive-value" if avg_profit > 0 else "negative-value"}'>
-                ${avg_profit:.2f}
-            </span>
-        </div>
-        <div class='stat-row'>
-            <span class='stat-label'>Largest Win</span>
-            <span class='stat-value positive-value'>${largest_win:.2f}</span>
-        </div>
-        <div class='stat-row'>
-            <span class='stat-label'>Largest Loss</span>
-            <span class='stat-value negative-value'>${largest_loss:.2f}</span>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-    finally:
-        db.close()
+    stats = load_trade_stats()
+    
+    if not stats["total_trades"]:
+        st.info("No trade data available")
+        return
+    
+    # Calculate statistics
+    total_trades = stats["total_trades"]
+    closed_trades = stats["closed_trades"]
+    winning_trades = stats["winning_trades"]
+    
+    win_rate = (winning_trades / closed_trades * 100) if closed_trades > 0 else 0
+    
+    total_profit = stats["total_profit"]
+    avg_profit = total_profit / total_trades if total_trades > 0 else 0
+    
+    # Largest win and loss among closed trades
+    largest_win = stats["largest_win"]
+    largest_loss = stats["largest_loss"]
+    
+    # Create card
+    _inject_stat_card_css()
+    
+    st.markdown("<div class='stat-card'>", unsafe_allow_html=True)
+    
+    st.markdown("<h3>Trading Performance</h3>", unsafe_allow_html=True)
+    
+    st.markdown(f"""
+    <div class='stat-row'>
+        <span class='stat-label'>Total Trades</span>
+        <span class='stat-value'>{total_trades}</span>
+    </div>
+    <div class='stat-row'>
+        <span class='stat-label'>Win Rate</span>
+        <span class='stat-value'>{win_rate:.2f}%</span>
+    </div>
+    <div class='stat-row'>
+        <span class='stat-label'>Total Profit</span>
+        <span class='stat-value {"positive-value" if total_profit > 0 else "negative-value"}'>
+            ${total_profit:.2f}
+        </span>
+    </div>
+    <div class='stat-row'>
+        <span class='stat-label'>Avg. Profit per Trade</span>
+        <span class='stat-value {"positive-value" if avg_profit > 0 else "negative-value"}'>
+            ${avg_profit:.2f}
+        </span>
+    </div>
+    <div class='stat-row'>
+        <span class='stat-label'>Largest Win</span>
+        <span class='stat-value positive-value'>${largest_win:.2f}</span>
+    </div>
+    <div class='stat-row'>
+        <span class='stat-label'>Largest Loss</span>
+        <span class='stat-value negative-value'>${largest_loss:.2f}</span>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("</div>", unsafe_allow_html=True)
 
 
 def create_bot_control_panel():
@@ -291,33 +327,42 @@ def create_bot_control_panel():
     }
 
 
-def display_system_status():
-    """Display system status information"""
-    import datetime
+@st.cache_data(ttl=5)
+def get_connection_status():
+    """Check MT5 and database connectivity (cached briefly to spare widget reruns)"""
     import MetaTrader5 as mt5
     
-    st.markdown("### System Status")
-    
-    # Current time
-    now = datetime.datetime.now()
-    
-    # MT5 connection status
+    # MT5 connection status - terminal_info is an in-process check,
+    # only fall back to a full initialize when no terminal is attached
     mt5_initialized = False
     try:
-        mt5_initialized = mt5.initialize()
+        mt5_initialized = mt5.terminal_info() is not None or mt5.initialize()
     except:
         pass
     
     # Database connection status
     db_status = "Unknown"
     try:
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))
+        with get_session() as db:
+            db.execute(text("SELECT 1"))
         db_status = "Connected"
-        db.close()
     except:
         db_status = "Disconnected"
     
+    return bool(mt5_initialized), db_status
+
+
+def display_system_status():
+    """Display system status information"""
+    import datetime
+    
+    st.markdown("### System Status")
+    
+    # Current time
+    now = datetime.datetime.now()
+    
+    mt5_initialized, db_status = get_connection_status()
+    
     # Create status table
     status_data = {
         "Component": ["System Time", "MT5 Connection", "Database Connection"],
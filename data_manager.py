@@ -4,35 +4,43 @@ This module provides a clean interface for daily investment tracking and
 other database interactions.
 """
 import datetime
+from contextlib import contextmanager
 import db_service
-from db_config import SessionLocal
+from db_config import get_session
 
 class DataManager:
     def __init__(self):
         """Initialize the data manager"""
         pass
     
-    def get_daily_investment(self, date):
+    @contextmanager
+    def session(self):
+        """Open a database session that several calls can share, e.g. for one bot tick"""
+        with get_session() as db:
+            yield db
+    
+    @contextmanager
+    def _use_session(self, db=None):
+        """Use the caller's session if given, otherwise open (and close) a new one"""
+        if db is not None:
+            yield db
+            return
+        with self.session() as owned_db:
+            yield owned_db
+    
+    def get_daily_investment(self, date, db=None):
         """Get total amount invested on given date from database"""
-        db = SessionLocal()
-        try:
+        with self._use_session(db) as db:
             return db_service.get_daily_investment(db, date)
-        finally:
-            db.close()
     
-    def update_daily_investment(self, date, amount):
+    def update_daily_investment(self, date, amount, db=None):
         """Add investment amount to daily tracker in database"""
-        db = SessionLocal()
-        try:
-            investment = db_service.update_daily_investment(db, date, amount)
-            return investment.amount
-        finally:
-            db.close()
+        with self._use_session(db) as db:
+            return db_service.update_daily_investment(db, date, amount)
     
-    def create_signal(self, symbol, signal_type, confidence=None, reason=None):
+    def create_signal(self, symbol, signal_type, confidence=None, reason=None, db=None):
         """Create a new signal record in the database"""
-        db = SessionLocal()
-        try:
+        with self._use_session(db) as db:
             signal_data = {
                 "symbol": symbol,
                 "signal_type": signal_type,
@@ -41,38 +49,36 @@ class DataManager:
             }
             db_signal = db_service.create_signal(db, signal_data)
             return db_signal.id
-        finally:
-            db.close()
     
-    def update_signal_executed(self, signal_id, executed=True):
+    def record_signal(self, symbol, signal_type, executed=False, trade_data=None, investment=None,
+                      investment_date=None, db=None):
+        """Store a tick's signal, its trade and daily investment in one transaction"""
+        with self._use_session(db) as db:
+            signal_data = {
+                "symbol": symbol,
+                "signal_type": signal_type,
+                "executed": executed
+            }
+            db_signal = db_service.record_signal(db, signal_data, trade_data, investment, investment_date)
+            return db_signal.id
+    
+    def update_signal_executed(self, signal_id, executed=True, db=None):
         """Mark a signal as executed"""
-        db = SessionLocal()
-        try:
+        with self._use_session(db) as db:
             db_service.update_signal_executed(db, signal_id, executed)
-        finally:
-            db.close()
     
-    def create_trade(self, trade_data):
+    def create_trade(self, trade_data, db=None):
         """Create a new trade record in the database"""
-        db = SessionLocal()
-        try:
+        with self._use_session(db) as db:
             db_trade = db_service.create_trade(db, trade_data)
             return db_trade.id
-        finally:
-            db.close()
     
-    def update_trade(self, ticket, trade_data):
+    def update_trade(self, ticket, trade_data, db=None):
         """Update an existing trade record"""
-        db = SessionLocal()
-        try:
+        with self._use_session(db) as db:
             db_service.update_trade(db, ticket, trade_data)
-        finally:
-            db.close()
     
-    def get_active_trades(self, symbol=None):
+    def get_active_trades(self, symbol=None, db=None):
         """Get all active trades, optionally filtered by symbol"""
-        db = SessionLocal()
-        try:
+        with self._use_session(db) as db:
             return db_service.get_active_trades(db, symbol)
-        finally:
-            db.close()
@@ -3,8 +3,10 @@ Database configuration for the trading bot.
 This file contains the database connection settings and SQLAlchemy setup.
 """
 import os
+from contextlib import contextmanager
+from functools import lru_cache
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 import config
 
@@ -20,14 +22,36 @@ DB_NAME = config.DB_NAME
 # Create the database URL
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Connection pool settings, overridable per deployment from config.py
+DB_POOL_SIZE = getattr(config, 'DB_POOL_SIZE', 20)
+DB_MAX_OVERFLOW = getattr(config, 'DB_MAX_OVERFLOW', 20)
+DB_POOL_TIMEOUT = getattr(config, 'DB_POOL_TIMEOUT', 30)
+DB_POOL_RECYCLE = getattr(config, 'DB_POOL_RECYCLE', 3600)
 
-# Create a sessionmaker
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create the SQLAlchemy engine - one pooled engine per URL shared process-wide,
+# pre_ping drops stale connections before they are handed out
+@lru_cache(maxsize=4)
+def _engine(url):
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        executemany_mode="values_plus_batch",  # psycopg2 fast executemany for bulk writes
+        future=True
+    )
+
+engine = _engine(DATABASE_URL)
+
+# Create a sessionmaker - objects stay loaded after commit, so callers
+# reading e.g. the new id don't trigger another SELECT
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True, expire_on_commit=False)
 
 # Create a base class for the ORM models
-Base = declarative_base()
+class Base(DeclarativeBase):
+    pass
 
 # Function to get a database session
 def get_db():
@@ -36,3 +60,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Context manager for a pooled session that is always returned to the pool
+@contextmanager
+def get_session():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -2,45 +2,132 @@
 Database service for the trading bot.
 This file contains functions for interacting with the database.
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import date, datetime
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import select, update, func, case, and_, bindparam
+from datetime import date, datetime, timedelta, timezone
+import time
+import numpy as np
 import models
 from db_config import SessionLocal, engine, Base
 
+# Rows per executemany statement for the bulk writers
+BULK_BATCH_SIZE = 1000
+
+# Rows fetched per round trip when streaming results through a server-side cursor
+STREAM_BATCH_SIZE = 500
+
+# Seconds a trade looked up by ticket is reused within the same session
+TRADE_CACHE_TTL = 5.0
+
+def _batches(rows: list, size: int = BULK_BATCH_SIZE):
+    """Yield consecutive slices of at most size rows"""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
 # Create tables if they don't exist
 def init_db():
     Base.metadata.create_all(bind=engine)
 
 # Trade operations
+def _open_times(trades_data: list):
+    """Convert the epoch "time" of every trade to naive UTC datetimes in one vectorized pass"""
+    seconds = np.array([t.get("time", 0) for t in trades_data], dtype="datetime64[s]")
+    times = seconds.astype("datetime64[us]").tolist()
+    return [time_open if "time" in t else None for t, time_open in zip(trades_data, times)]
+
+def _trade_row(trade_data: dict, time_open: datetime = None):
+    """Map incoming trade data (e.g. from MT5) to trades table columns.
+    
+    time_open may be passed in pre-converted (see _open_times); otherwise the
+    epoch "time" is converted here, falling back to now.
+    """
+    if time_open is None:
+        if "time" in trade_data:
+            time_open = datetime.fromtimestamp(trade_data["time"], timezone.utc).replace(tzinfo=None)
+        else:
+            time_open = datetime.utcnow()
+    return {
+        "ticket": trade_data["ticket"],
+        "symbol": trade_data["symbol"],
+        "type": trade_data["type"],
+        "volume": trade_data["volume"],
+        "price_open": trade_data["price_open"],
+        "profit": trade_data.get("profit", 0.0),
+        "time_open": time_open,
+        "is_active": True,
+        "signal_id": trade_data.get("signal_id")
+    }
+
 def create_trade(db: Session, trade_data: dict):
     """Create a new trade record in the database"""
-    db_trade = models.Trade(
-        ticket=trade_data["ticket"],
-        symbol=trade_data["symbol"],
-        type=trade_data["type"],
-        volume=trade_data["volume"],
-        price_open=trade_data["price_open"],
-        profit=trade_data.get("profit", 0.0),
-        time_open=datetime.fromtimestamp(trade_data["time"]) if "time" in trade_data else datetime.utcnow(),
-        is_active=True,
-        signal_id=trade_data.get("signal_id")
-    )
+    db_trade = models.Trade(**_trade_row(trade_data))
     db.add(db_trade)
     db.commit()
-    db.refresh(db_trade)
     return db_trade
 
+def _insert_trades(db: Session, trades_data: list):
+    """Execute (without committing) batched INSERTs for all given trades"""
+    for batch in _batches(trades_data):
+        rows = [_trade_row(t, time_open) for t, time_open in zip(batch, _open_times(batch))]
+        db.execute(models.Trade.__table__.insert(), rows)
+
+# Columns that callers may change through update_trade / update_trades_bulk
+_TRADE_UPDATABLE = frozenset({"profit", "price_close", "is_active", "time_close"})
+
 def update_trade(db: Session, ticket: int, trade_data: dict):
-    """Update an existing trade record"""
-    db_trade = get_trade_by_ticket(db, ticket)
-    if db_trade:
-        for key, value in trade_data.items():
-            if hasattr(db_trade, key):
-                setattr(db_trade, key, value)
-        db.commit()
-        db.refresh(db_trade)
-    return db_trade
+    """Update an existing trade record, returning the number of rows changed"""
+    values = {k: v for k, v in trade_data.items() if k in _TRADE_UPDATABLE}
+    if not values:
+        return 0
+    _forget_trades(db, (ticket,))
+    result = db.execute(
+        update(models.Trade).where(models.Trade.ticket == ticket).values(**values)
+    )
+    db.commit()
+    return result.rowcount
+
+def update_trades_bulk(db: Session, trades_data: list):
+    """Update several trades by ticket with a single executemany UPDATE.
+    
+    Every dict needs a "ticket" key and the same set of column keys.
+    """
+    if not trades_data:
+        return 0
+    rowcount = _update_trades(db, trades_data)
+    db.commit()
+    return rowcount
+
+def _update_trades(db: Session, trades_data: list):
+    """Execute (without committing) one UPDATE keyed by ticket for all given trades"""
+    table = models.Trade.__table__
+    stmt = table.update().where(table.c.ticket == bindparam("b_ticket"))
+    _forget_trades(db, (t["ticket"] for t in trades_data))
+    rows = [
+        {**{k: v for k, v in t.items() if k in _TRADE_UPDATABLE}, "b_ticket": t["ticket"]}
+        for t in trades_data
+    ]
+    return db.execute(stmt, rows).rowcount
+
+def sync_trades(db: Session, trades_data: list):
+    """Refresh profit of known trades and insert new ones in a single transaction.
+    
+    Used for MT5 positions: one SELECT finds which tickets already exist,
+    then one UPDATE and one INSERT cover the whole batch.
+    """
+    if not trades_data:
+        return
+    tickets = [t["ticket"] for t in trades_data]
+    existing = set(db.scalars(
+        select(models.Trade.ticket).where(models.Trade.ticket.in_(tickets))
+    ))
+    updates = [{"ticket": t["ticket"], "profit": t["profit"]} for t in trades_data if t["ticket"] in existing]
+    inserts = [t for t in trades_data if t["ticket"] not in existing]
+    if updates:
+        _update_trades(db, updates)
+    if inserts:
+        _insert_trades(db, inserts)
+    db.commit()
 
 def close_trade(db: Session, ticket: int, price_close: float, profit: float):
     """Mark a trade as closed with final price and profit"""
@@ -51,94 +138,180 @@ def close_trade(db: Session, ticket: int, price_close: float, profit: float):
         db_trade.time_close = datetime.utcnow()
         db_trade.is_active = False
         db.commit()
-        db.refresh(db_trade)
+        _forget_trades(db, (ticket,))
     return db_trade
 
+def _trade_cache(db: Session):
+    """Per-session {ticket: (expires_at, trade)} cache, discarded with the session"""
+    return db.info.setdefault("trades_by_ticket", {})
+
+def _forget_trades(db: Session, tickets):
+    """Drop cached trades whose rows are being changed behind the ORM's back"""
+    cache = db.info.get("trades_by_ticket")
+    if cache:
+        for ticket in tickets:
+            cache.pop(ticket, None)
+
 def get_trade_by_ticket(db: Session, ticket: int):
-    """Get a trade by its ticket number"""
-    return db.query(models.Trade).filter(models.Trade.ticket == ticket).first()
+    """Get a trade by its ticket number, reusing a recent lookup from the same session"""
+    cache = _trade_cache(db)
+    now = time.monotonic()
+    hit = cache.get(ticket)
+    if hit and hit[0] > now:
+        return hit[1]
+    db_trade = db.query(models.Trade).filter(models.Trade.ticket == ticket).first()
+    if db_trade is not None:
+        cache[ticket] = (now + TRADE_CACHE_TTL, db_trade)
+    return db_trade
 
-def get_active_trades(db: Session, symbol: str = None):
-    """Get all active trades, optionally filtered by symbol"""
-    query = db.query(models.Trade).filter(models.Trade.is_active == True)
+def iter_active_trades(db: Session, symbol: str = None):
+    """Stream active trades in chunks from a server-side cursor, optionally filtered by symbol.
+    
+    The session must stay open while the result is iterated.
+    """
+    # Load the related signals in one IN query per chunk instead of one per trade
+    query = db.query(models.Trade).options(
+        selectinload(models.Trade.signal)
+    ).filter(models.Trade.is_active == True)
     if symbol:
         query = query.filter(models.Trade.symbol == symbol)
-    return query.all()
+    return query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+
+def get_active_trades(db: Session, symbol: str = None):
+    """Get all active trades, optionally filtered by symbol"""
+    return list(iter_active_trades(db, symbol))
+
+def get_trade_stats(db: Session):
+    """Get aggregate trade statistics computed in a single query"""
+    trade = models.Trade
+    closed = trade.is_active == False
+    return db.query(
+        func.count(trade.id).label("total_trades"),
+        func.count(case((trade.is_active == True, 1))).label("open_trades"),
+        func.count(case((closed, 1))).label("closed_trades"),
+        func.count(case((and_(closed, trade.profit > 0), 1))).label("winning_trades"),
+        func.count(case((and_(closed, trade.profit < 0), 1))).label("losing_trades"),
+        func.coalesce(func.sum(trade.profit), 0.0).label("total_profit"),
+        func.coalesce(func.max(case((closed, trade.profit))), 0.0).label("largest_win"),
+        func.coalesce(func.min(case((closed, trade.profit))), 0.0).label("largest_loss")
+    ).one()
 
 # Signal operations
+def _signal_row(signal_data: dict):
+    """Map incoming signal data to signals table columns"""
+    return {
+        "symbol": signal_data["symbol"],
+        "signal_type": signal_data["signal_type"],
+        "confidence": signal_data.get("confidence"),
+        "reason": signal_data.get("reason"),
+        "executed": signal_data.get("executed", False)
+    }
+
 def create_signal(db: Session, signal_data: dict):
     """Create a new signal record in the database"""
-    db_signal = models.Signal(
-        symbol=signal_data["symbol"],
-        signal_type=signal_data["signal_type"],
-        confidence=signal_data.get("confidence"),
-        reason=signal_data.get("reason"),
-        executed=signal_data.get("executed", False)
-    )
+    db_signal = models.Signal(**_signal_row(signal_data))
     db.add(db_signal)
     db.commit()
-    db.refresh(db_signal)
     return db_signal
 
+def record_signal(db: Session, signal_data: dict, trade_data: dict = None, investment: float = None,
+                  investment_date: date = None):
+    """Store a signal with its resulting trade and daily investment in one transaction.
+    
+    The trade (if any) is linked to the new signal, and investment (if any) is
+    added to the total for investment_date (default today). Everything is committed once.
+    """
+    db_signal = models.Signal(**_signal_row(signal_data))
+    db.add(db_signal)
+    if trade_data is not None:
+        # Flush to get the signal id for the trade's foreign key
+        db.flush()
+        db.add(models.Trade(**_trade_row(dict(trade_data, signal_id=db_signal.id))))
+    if investment:
+        db.execute(_daily_investment_upsert(investment_date or date.today(), investment))
+    db.commit()
+    return db_signal
+
+def get_recent_signals(db: Session, n: int = 10):
+    """Get the n most recently generated signals, newest first"""
+    return db.query(models.Signal).order_by(
+        models.Signal.time_generated.desc()
+    ).limit(n).all()
+
 def update_signal_executed(db: Session, signal_id: int, executed: bool = True):
     """Mark a signal as executed"""
     db_signal = db.query(models.Signal).filter(models.Signal.id == signal_id).first()
     if db_signal:
         db_signal.executed = executed
         db.commit()
-        db.refresh(db_signal)
     return db_signal
 
 # Daily investment operations
 def get_daily_investment(db: Session, date_obj: date):
     """Get the daily investment amount for a specific date"""
     date_start = datetime.combine(date_obj, datetime.min.time())
-    db_investment = db.query(models.DailyInvestment).filter(
-        models.DailyInvestment.date == date_start
-    ).first()
-    return db_investment.amount if db_investment else 0.0
+    amount = db.scalar(
+        select(models.DailyInvestment.amount).where(models.DailyInvestment.date == date_start)
+    )
+    return amount if amount is not None else 0.0
 
-def update_daily_investment(db: Session, date_obj: date, amount: float):
-    """Update or create the daily investment amount for a specific date"""
+def _daily_investment_upsert(date_obj: date, amount: float):
+    """INSERT ... ON CONFLICT (date) DO UPDATE adding amount to the day's total"""
     date_start = datetime.combine(date_obj, datetime.min.time())
-    db_investment = db.query(models.DailyInvestment).filter(
-        models.DailyInvestment.date == date_start
-    ).first()
-    
-    if db_investment:
-        db_investment.amount += amount
-    else:
-        db_investment = models.DailyInvestment(date=date_start, amount=amount)
-        db.add(db_investment)
+    table = models.DailyInvestment.__table__
+    stmt = pg_insert(table).values(date=date_start, amount=amount)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.date],
+        set_={"amount": table.c.amount + stmt.excluded.amount}
+    ).returning(table.c.amount)
+
+def update_daily_investment(db: Session, date_obj: date, amount: float):
+    """Add to the daily investment amount for a specific date and return the new total.
     
+    A single INSERT ... ON CONFLICT (date) DO UPDATE, so concurrent writers
+    can't race between a SELECT and the INSERT.
+    """
+    total = db.execute(_daily_investment_upsert(date_obj, amount)).scalar_one()
+    db.commit()
+    return total
+
+# Market data operations
+def create_market_data_bulk(db: Session, rows: list):
+    """Insert several market data snapshots with batched executemany INSERTs and one commit"""
+    if not rows:
+        return 0
+    table = models.MarketData.__table__
+    for batch in _batches(rows):
+        db.execute(table.insert(), batch)
     db.commit()
-    if db_investment:
-        db.refresh(db_investment)
-    return db_investment
+    return len(rows)
 
 # News event operations
+def _news_row(news_data: dict):
+    """Map incoming news data to news_events table columns"""
+    return {
+        "event_time": news_data["event_time"],
+        "event_name": news_data["event_name"],
+        "currency": news_data["currency"],
+        "impact": news_data["impact"],
+        "actual": news_data.get("actual"),
+        "forecast": news_data.get("forecast"),
+        "previous": news_data.get("previous"),
+        "processed": news_data.get("processed", False)
+    }
+
 def create_news_event(db: Session, news_data: dict):
     """Create a new news event record in the database"""
-    db_news = models.NewsEvent(
-        event_time=news_data["event_time"],
-        event_name=news_data["event_name"],
-        currency=news_data["currency"],
-        impact=news_data["impact"],
-        actual=news_data.get("actual"),
-        forecast=news_data.get("forecast"),
-        previous=news_data.get("previous"),
-        processed=news_data.get("processed", False)
-    )
+    db_news = models.NewsEvent(**_news_row(news_data))
     db.add(db_news)
     db.commit()
-    db.refresh(db_news)
     return db_news
 
 def get_upcoming_news_events(db: Session, hours: int = 24):
     """Get upcoming news events within the next specified hours"""
+    # Take "now" once so both ends of the window agree
     now = datetime.utcnow()
-    future = now + datetime.timedelta(hours=hours)
+    future = now + timedelta(hours=hours)
     return db.query(models.NewsEvent).filter(
-        models.NewsEvent.event_time > now,
-        models.NewsEvent.event_time < future
-    ).all()
+        models.NewsEvent.event_time.between(now, future)
+    ).order_by(models.NewsEvent.event_time).all()
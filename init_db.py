@@ -4,8 +4,6 @@ This script initializes the database tables and can be used to reset the databas
 """
 import os
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy_utils import database_exists, create_database
 import argparse
 from db_config import DATABASE_URL, engine, Base
 
@@ -23,6 +21,9 @@ def create_tables():
 
 def init_database(reset=False):
     """Initialize the database"""
+    # sqlalchemy_utils is only needed here, so keep it off the import path
+    from sqlalchemy_utils import database_exists, create_database
+    
     try:
         # Check if database exists, if not create it
         if not database_exists(DATABASE_URL):
@@ -0,0 +1,72 @@
+"""
+Persistent cache for LLM responses.
+Identical prompts within the TTL are answered from disk instead of the Together API.
+
+Stored in SQLite, so the bot and the dashboard processes can share it safely.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Cache location and default lifetime, overridable from config.py
+CACHE_DIR = getattr(config, 'LLM_CACHE_DIR', os.path.join('.cache', 'llm'))
+DEFAULT_TTL = getattr(config, 'CHECK_INTERVAL_SECONDS', 300)
+
+# Seconds a writer waits for another process's lock before giving up
+_BUSY_TIMEOUT = 5.0
+
+def make_key(model, *parts):
+    """Build a cache key from the model name and the full prompt text"""
+    return hashlib.sha256("\n".join((model,) + parts).encode("utf-8")).hexdigest()
+
+def _connect():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CACHE_DIR, "responses.sqlite3"), timeout=_BUSY_TIMEOUT)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses "
+        "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, content TEXT NOT NULL)"
+    )
+    return conn
+
+def get_cached(key):
+    """Return the cached response for key, or None if missing or expired"""
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT content FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        finally:
+            conn.close()
+    except Exception:
+        logger.exception("Error reading LLM cache")
+        return None
+    return row[0] if row else None
+
+def store(key, content, ttl=DEFAULT_TTL):
+    """Store a response under key for ttl seconds, dropping expired entries.
+
+    Signal prompts embed live prices, so most keys are never asked for again;
+    pruning on write keeps the store bounded to roughly one TTL of answers.
+    """
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, content) VALUES (?, ?, ?)",
+                    (key, now + ttl, content),
+                )
+        finally:
+            conn.close()
+    except Exception:
+        logger.exception("Error writing LLM cache")
@@ -0,0 +1,77 @@
+"""
+LLM client for the trading bot.
+Holds the one Together client shared by every module that talks to the model,
+and lets several questions share a single chat completion.
+"""
+import re
+import threading
+import config
+import llm_cache
+
+# Upper bound on a single chat completion, so a slow API can't stall a whole tick
+TIMEOUT_SECONDS = getattr(config, 'LLM_TIMEOUT_SECONDS', 15)
+# Transient failures (e.g. 429s) are retried with backoff by the SDK on the same client
+MAX_RETRIES = getattr(config, 'LLM_MAX_RETRIES', 2)
+
+_client = None
+_client_lock = threading.Lock()
+
+_ANSWER_LINE = re.compile(r"\s*Q(\d+)\s*:\s*(.*)", re.IGNORECASE)
+
+def get_client():
+    """Return the shared Together client, creating it on first use.
+
+    The together SDK is imported here so modules that never reach the LLM
+    don't pay for it. The one client is reused so all callers share its
+    HTTP connections.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from together import Together
+                _client = Together(
+                    api_key=config.TOGETHER_API_KEY,
+                    timeout=TIMEOUT_SECONDS,
+                    max_retries=MAX_RETRIES
+                )
+    return _client
+
+def batch_decide(prompts, system_prompt=None):
+    """
+    Ask several questions in one chat completion.
+
+    Args:
+        prompts (list): Question prompts, answered in order
+        system_prompt (str): Optional system message for the whole batch
+
+    Returns:
+        list: Upper-cased answer per prompt, or None where the model gave no
+        labelled answer (callers should then ask that question on its own)
+    """
+    questions = "\n\n".join(f"Q{i}: {prompt.strip()}" for i, prompt in enumerate(prompts, start=1))
+    content = (
+        "Answer each question below on a single line, prefixed with its label "
+        "(Q1:, Q2:, ...), following the answer format each question asks for.\n\n"
+        + questions
+    )
+    messages = [{"role": "user", "content": content}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+
+    cache_key = llm_cache.make_key(config.TOGETHER_MODEL, system_prompt or "", content)
+    result = llm_cache.get_cached(cache_key)
+    if result is None:
+        response = get_client().chat.completions.create(
+            model=config.TOGETHER_MODEL,
+            messages=messages
+        )
+        result = response.choices[0].message.content if response.choices else ""
+        llm_cache.store(cache_key, result)
+
+    answers = {}
+    for line in result.splitlines():
+        match = _ANSWER_LINE.match(line)
+        if match:
+            answers.setdefault(int(match.group(1)), match.group(2).strip().upper())
+    return [answers.get(i) or None for i in range(1, len(prompts) + 1)]
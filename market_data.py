@@ -2,50 +2,157 @@
 Market data module for interacting with MetaTrader 5.
 This module handles fetching market data and positions from MT5.
 """
-import MetaTrader5 as mt5
 import config
+import mt5_session
 from db_config import SessionLocal
 import db_service
-from models import MarketData
-import pytz
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo
+import atexit
+import logging
+import math
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Fixed for the life of the process, so resolved once instead of on every tick
+_TZ = ZoneInfo(config.TIMEZONE)
+_DAILY_TARGET = float(config.DAILY_PROFIT_TARGET)
+
+class MarketDataWriter:
+    """Background writer that batches market data snapshots into bulk INSERTs"""
+    
+    def __init__(self, batch_size=500, flush_interval=1.0, maxsize=10_000):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def put(self, row):
+        """Queue a snapshot row; drops it if the writer has fallen far behind"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            logger.warning("Snapshot queue full, dropping snapshot")
+    
+    def flush(self):
+        """Write out everything still queued (called at interpreter exit)"""
+        rows = self._drain(timeout=None)
+        while rows:
+            self._write(rows)
+            rows = self._drain(timeout=None)
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="MarketDataWriter", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+    
+    def _drain(self, timeout):
+        """Collect up to batch_size rows, waiting up to timeout for the first one"""
+        rows = []
+        try:
+            if timeout is None:
+                rows.append(self.queue.get_nowait())
+            else:
+                rows.append(self.queue.get(timeout=timeout))
+            while len(rows) < self.batch_size:
+                rows.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return rows
+    
+    def _run(self):
+        while True:
+            rows = self._drain(timeout=self.flush_interval)
+            if rows:
+                self._write(rows)
+    
+    def _write(self, rows):
+        db = SessionLocal()
+        try:
+            db_service.create_market_data_bulk(db, rows)
+        except Exception:
+            db.rollback()
+            logger.exception("Error saving market data snapshots")
+        finally:
+            db.close()
+
+# Shared by all collectors so snapshots from every caller are batched together
+snapshot_writer = MarketDataWriter()
 
 class MarketDataCollector:
     def __init__(self):
         """Initialize the market data collector"""
-        pass
+        self._tz = _TZ
+        # (date, utc_start, utc_end) of the current local day, see _utc_day_window
+        self._day_window = (None, None, None)
+    
+    def __enter__(self):
+        """Make sure the shared MT5 session is open for the with-block"""
+        self._ensure_connected()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        # The session is process-wide (mt5_session) and shut down at exit, not here
+        return False
+    
+    def _ensure_connected(self):
+        """Reuse the shared MT5 session, connecting only if it is gone"""
+        if not mt5_session.ensure_connected():
+            raise Exception("MT5 session unavailable")
+    
+    def _utc_day_window(self):
+        """Return today's (start, end) in UTC, recomputed only when the local date changes"""
+        today = datetime.now(self._tz).date()
+        if self._day_window[0] != today:
+            start = datetime.combine(today, datetime.min.time(), tzinfo=self._tz).astimezone(timezone.utc)
+            end = datetime.combine(today, datetime.max.time(), tzinfo=self._tz).astimezone(timezone.utc)
+            self._day_window = (today, start, end)
+        return self._day_window[1:]
     
     def connect_mt5(self):
         """Connect to MT5 terminal"""
-        if not mt5.initialize():
-            raise Exception(f"MT5 initialization failed! Error code: {mt5.last_error()}")
-        
-        login_result = mt5.login(config.MT5_ACCOUNT, password=config.MT5_PASSWORD, server=config.MT5_SERVER)
-        if not login_result:
-            raise Exception(f"MT5 login failed! Error code: {mt5.last_error()}")
-        
+        self._ensure_connected()
         return True
     
     def disconnect_mt5(self):
         """Disconnect from MT5 terminal"""
+        # MetaTrader5 loads a large native library, so it is imported on first use
+        import MetaTrader5 as mt5
         mt5.shutdown()
     
+    def _positions_raw(self, symbol):
+        """Get open positions for symbol, assuming MT5 is already connected"""
+        import MetaTrader5 as mt5
+        return mt5.positions_get(symbol=symbol) or []
+    
     def get_positions(self, symbol=None):
         """Get all current open positions, optionally filtered by symbol"""
         symbol_filter = symbol or config.SYMBOL
         try:
-            self.connect_mt5()
-            positions = mt5.positions_get(symbol=symbol_filter) or []
+            self._ensure_connected()
+        except Exception:
+            logger.exception("Error getting positions")
+            return []
+        try:
+            positions = self._positions_raw(symbol_filter)
             return positions
-        except Exception as e:
-            print(f"Error getting positions: {e}")
+        except Exception:
+            logger.exception("Error getting positions")
             return []
-        finally:
-            self.disconnect_mt5()
     
-    def get_positions_as_dict(self, symbol=None):
-        """Get all current open positions as a list of dictionaries"""
-        positions = self.get_positions(symbol)
+    def get_positions_as_dict(self, symbol=None, positions=None):
+        """Get all current open positions as a list of dictionaries.
+        
+        Already fetched MT5 positions may be passed in to skip the lookup.
+        """
+        if positions is None:
+            positions = self.get_positions(symbol)
         current_trades = []
         
         for pos in positions:
@@ -59,29 +166,33 @@ class MarketDataCollector:
                 'time': pos.time,
             }
             current_trades.append(trade_info)
-            
-            # Update trade in database if it exists
-            db = SessionLocal()
-            try:
-                existing_trade = db_service.get_trade_by_ticket(db, pos.ticket)
-                if existing_trade:
-                    # Update profit information
-                    db_service.update_trade(db, pos.ticket, {"profit": pos.profit})
-                else:
-                    # This is a new trade from MT5, store it in the database
-                    db_service.create_trade(db, trade_info)
-            except Exception as e:
-                print(f"Error updating trade in database: {e}")
-            finally:
-                db.close()
+        
+        # Update existing trades / store new ones from MT5 in one round trip
+        db = SessionLocal()
+        try:
+            db_service.sync_trades(db, current_trades)
+        except Exception:
+            db.rollback()
+            logger.exception("Error updating trades in database")
+        finally:
+            db.close()
         
         return current_trades
     
-    def get_symbol_info(self, symbol=None):
-        """Get symbol information from MT5 and calculate profit metrics"""
+    def get_symbol_info(self, symbol=None, positions=None):
+        """Get symbol information from MT5 and calculate profit metrics.
+        
+        Already fetched MT5 positions for the symbol may be passed in to skip the lookup.
+        """
+        import MetaTrader5 as mt5
+        
         symbol_name = symbol or config.SYMBOL
         try:
-            self.connect_mt5()
+            self._ensure_connected()
+        except Exception:
+            logger.exception("Error getting symbol info")
+            return {}
+        try:
             symbol_info_raw = mt5.symbol_info(symbol_name)
             if not symbol_info_raw:
                 return {}
@@ -114,49 +225,50 @@ class MarketDataCollector:
                 symbol_info['margin_level'] = account_info.margin_level
             
             # Calculate daily profit metrics - always populate with actual values, not None
-            symbol_info['daily_profit_target'] = float(config.DAILY_PROFIT_TARGET)  # Ensure it's a float
+            symbol_info['daily_profit_target'] = _DAILY_TARGET
             
             # Get today's profit from open and closed trades
             db = SessionLocal()
             try:
                 # Get IST timezone
-                ist_tz = pytz.timezone(config.TIMEZONE)
-                today_ist = datetime.now(ist_tz).date()
+                ist_tz = self._tz
                 
-                # Convert to UTC for database query (assuming DB stores in UTC)
-                today_utc_start = datetime.combine(today_ist, datetime.min.time()).astimezone(pytz.UTC)
-                today_utc_end = datetime.combine(today_ist, datetime.max.time()).astimezone(pytz.UTC)
+                # Today's IST day as a UTC range for the database query (DB stores UTC)
+                today_utc_start, today_utc_end = self._utc_day_window()
                 
                 try:
                     # Query for today's profit from completed trades
                     closed_profit = db.query(db_service.func.sum(db_service.models.Trade.profit)).filter(
                         db_service.models.Trade.time_close.between(today_utc_start, today_utc_end)
                     ).scalar() or 0.0
-                except Exception as e:
-                    print(f"Error getting closed profit: {e}")
+                except Exception:
+                    logger.exception("Error getting closed profit")
                     closed_profit = 0.0
                 
-                # Get profit from current open trades
+                # Get profit from current open trades, fetching positions only if not given
                 try:
-                    positions = self.get_positions(symbol_name)
-                    open_profit = sum(pos.profit for pos in positions) if positions else 0.0
-                except Exception as e:
-                    print(f"Error getting open positions profit: {e}")
+                    if positions is None:
+                        positions = self._positions_raw(symbol_name)
+                    open_profit = math.fsum(pos.profit for pos in positions)
+                except Exception:
+                    logger.exception("Error getting open positions profit")
+                    positions = ()
                     open_profit = 0.0
                 
                 # Total daily profit - ensure we have a numeric value
                 current_daily_profit = closed_profit + open_profit
                 symbol_info['current_daily_profit'] = current_daily_profit
-                print(f"[MarketData] Current daily profit: ${current_daily_profit:.2f}, Target: ${float(config.DAILY_PROFIT_TARGET):.2f}")
+                logger.info("Current daily profit: $%.2f, Target: $%.2f", current_daily_profit, _DAILY_TARGET)
                 
                 # Check if target is achieved
-                target_achieved = current_daily_profit >= float(config.DAILY_PROFIT_TARGET)
+                target_achieved = current_daily_profit >= _DAILY_TARGET
                 symbol_info['profit_target_achieved'] = target_achieved
                 
                 # Simple prediction based on current trajectory
                 if len(positions) > 0:
-                    avg_hourly_profit = current_daily_profit / (datetime.now(ist_tz).hour + 1)  # avoid div by zero
-                    hours_left = 24 - datetime.now(ist_tz).hour
+                    current_hour = datetime.now(ist_tz).hour
+                    avg_hourly_profit = current_daily_profit / (current_hour + 1)  # avoid div by zero
+                    hours_left = 24 - current_hour
                     predicted_profit = current_daily_profit + (avg_hourly_profit * hours_left * 0.7)  # conservative estimate
                     symbol_info['predicted_profit'] = predicted_profit
                     symbol_info['predicted_direction'] = 'UP' if open_profit > 0 else 'DOWN' if open_profit < 0 else 'NEUTRAL'
@@ -164,68 +276,55 @@ class MarketDataCollector:
                 # Save market data snapshot to database
                 self.save_market_data_snapshot(symbol_info)
                 
-            except Exception as e:
-                print(f"Error calculating profit metrics: {e}")
+            except Exception:
+                logger.exception("Error calculating profit metrics")
             finally:
                 db.close()
                 
             return symbol_info
-        except Exception as e:
-            print(f"Error getting symbol info: {e}")
+        except Exception:
+            logger.exception("Error getting symbol info")
             return {}
-        finally:
-            self.disconnect_mt5()
     
     def save_market_data_snapshot(self, symbol_info):
-        """Save market data snapshot to the database with IST timezone timestamp"""
+        """Queue a market data snapshot for the database with IST timezone timestamp"""
         try:
             # Get current time in IST
-            ist_tz = pytz.timezone(config.TIMEZONE)
-            current_time_ist = datetime.now(ist_tz)
+            current_time_ist = datetime.now(self._tz)
             
-            db = SessionLocal()
-            try:
-                # Create new market data snapshot
-                market_data = MarketData(
-                    symbol=symbol_info.get('symbol'),
-                    bid=symbol_info.get('bid'),
-                    ask=symbol_info.get('ask'),
-                    spread=symbol_info.get('spread'),
-                    time=current_time_ist,
-                    
-                    # Additional price info
-                    bidhigh=symbol_info.get('bidhigh'),
-                    bidlow=symbol_info.get('bidlow'),
-                    askhigh=symbol_info.get('askhigh'),
-                    asklow=symbol_info.get('asklow'),
-                    
-                    # Account information
-                    balance=symbol_info.get('balance'),
-                    equity=symbol_info.get('equity'),
-                    margin=symbol_info.get('margin'),
-                    margin_free=symbol_info.get('margin_free'),
-                    margin_level=symbol_info.get('margin_level'),
-                    
-                    # Profit metrics
-                    daily_profit_target=symbol_info.get('daily_profit_target'),
-                    current_daily_profit=symbol_info.get('current_daily_profit'),
-                    profit_target_achieved=symbol_info.get('profit_target_achieved', False),
-                    
-                    # Predictions
-                    predicted_profit=symbol_info.get('predicted_profit'),
-                    predicted_direction=symbol_info.get('predicted_direction')
-                )
+            # Written in batches by the background writer, off the trading loop
+            snapshot_writer.put({
+                'symbol': symbol_info.get('symbol'),
+                'bid': symbol_info.get('bid'),
+                'ask': symbol_info.get('ask'),
+                'spread': symbol_info.get('spread'),
+                'time': current_time_ist,
                 
-                db.add(market_data)
-                db.commit()                
-            except Exception as e:
-                db.rollback()
-                print(f"Error saving market data snapshot: {e}")
-            finally:
-                db.close()
+                # Additional price info
+                'bidhigh': symbol_info.get('bidhigh'),
+                'bidlow': symbol_info.get('bidlow'),
+                'askhigh': symbol_info.get('askhigh'),
+                'asklow': symbol_info.get('asklow'),
+                
+                # Account information
+                'balance': symbol_info.get('balance'),
+                'equity': symbol_info.get('equity'),
+                'margin': symbol_info.get('margin'),
+                'margin_free': symbol_info.get('margin_free'),
+                'margin_level': symbol_info.get('margin_level'),
+                
+                # Profit metrics
+                'daily_profit_target': symbol_info.get('daily_profit_target'),
+                'current_daily_profit': symbol_info.get('current_daily_profit'),
+                'profit_target_achieved': symbol_info.get('profit_target_achieved', False),
+                
+                # Predictions
+                'predicted_profit': symbol_info.get('predicted_profit'),
+                'predicted_direction': symbol_info.get('predicted_direction')
+            })
                 
-        except Exception as e:
-            print(f"Error in save_market_data_snapshot: {e}")
+        except Exception:
+            logger.exception("Error in save_market_data_snapshot")
     
     def get_currency_price(self, symbol=None):
         """Get current price for a currency pair"""
@@ -0,0 +1,71 @@
+"""Convert trades.time_open from local time to naive UTC
+
+Revision ID: 0e8c14eebf4e
+Revises: 8b2e4d6f1a9c
+Create Date: 2026-10-15 12:34:08.517203
+
+Trades used to store datetime.fromtimestamp(), i.e. the bot host's local time;
+they are now stored as naive UTC like every other timestamp. Existing rows are
+shifted accordingly. Run this on the bot host, or name the zone the bot ran in:
+
+    alembic -x source_tz=Asia/Kolkata upgrade head
+"""
+from datetime import timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0e8c14eebf4e'
+down_revision: Union[str, Sequence[str], None] = '8b2e4d6f1a9c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+trades = sa.table(
+    'trades',
+    sa.column('id', sa.Integer),
+    sa.column('time_open', sa.DateTime),
+)
+
+
+def _source_tz():
+    """Zone the old rows were written in; None means this machine's local time"""
+    name = context.get_x_argument(as_dictionary=True).get('source_tz')
+    return ZoneInfo(name) if name else None
+
+
+def _local_to_utc(value, tz):
+    aware = value.replace(tzinfo=tz) if tz is not None else value.astimezone()
+    return aware.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _utc_to_local(value, tz):
+    local = value.replace(tzinfo=timezone.utc).astimezone(tz)
+    return local.replace(tzinfo=None)
+
+
+def _convert(convert):
+    bind = op.get_bind()
+    tz = _source_tz()
+    rows = bind.execute(
+        sa.select(trades.c.id, trades.c.time_open).where(trades.c.time_open.isnot(None))
+    ).all()
+    if not rows:
+        return
+    bind.execute(
+        trades.update().where(trades.c.id == sa.bindparam('b_id')).values(time_open=sa.bindparam('b_time_open')),
+        [{'b_id': row.id, 'b_time_open': convert(row.time_open, tz)} for row in rows],
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _convert(_local_to_utc)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _convert(_utc_to_local)
@@ -2,8 +2,9 @@
 Database models for the trading bot.
 This file contains the SQLAlchemy ORM models for storing trade data.
 """
-from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from typing import List, Optional
+from sqlalchemy import Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Index, text
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 
 from db_config import Base
@@ -12,92 +13,104 @@ class Trade(Base):
     """Model for storing trade data"""
     __tablename__ = "trades"
 
-    id = Column(Integer, primary_key=True, index=True)
-    ticket = Column(BigInteger, unique=True, index=True)
-    symbol = Column(String, index=True)
-    type = Column(String)  # "BUY" or "SELL"
-    volume = Column(Float)
-    price_open = Column(Float)
-    price_close = Column(Float, nullable=True)
-    profit = Column(Float, nullable=True)
-    time_open = Column(DateTime, default=datetime.utcnow)
-    time_close = Column(DateTime, nullable=True)
-    is_active = Column(Boolean, default=True)
-    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    ticket: Mapped[Optional[int]] = mapped_column(BigInteger, unique=True, index=True)
+    symbol: Mapped[Optional[str]] = mapped_column(String, index=True)
+    type: Mapped[Optional[str]] = mapped_column(String)  # "BUY" or "SELL"
+    volume: Mapped[Optional[float]] = mapped_column(Float)
+    price_open: Mapped[Optional[float]] = mapped_column(Float)
+    price_close: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    profit: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    time_open: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    time_close: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+
     # Relationship with signals
-    signal_id = Column(Integer, ForeignKey("signals.id"), nullable=True)
-    signal = relationship("Signal", back_populates="trades")
+    signal_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("signals.id"), nullable=True)
+    signal: Mapped[Optional["Signal"]] = relationship("Signal", back_populates="trades")
+
+    __table_args__ = (
+        # Covers the daily closed-profit sum so it can be answered from the index
+        Index("ix_trades_time_close", "time_close", "is_active", "profit"),
+        # Partial index over live trades only, for get_active_trades(symbol)
+        Index("ix_trades_active_symbol", "symbol", postgresql_where=text("is_active")),
+    )
 
 
 class Signal(Base):
     """Model for storing trade signals"""
     __tablename__ = "signals"
 
-    id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String, index=True)
-    signal_type = Column(String)  # "BUY", "SELL", or "HOLD"
-    confidence = Column(Float, nullable=True)
-    reason = Column(String, nullable=True)
-    time_generated = Column(DateTime, default=datetime.utcnow)
-    executed = Column(Boolean, default=False)
-    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    symbol: Mapped[Optional[str]] = mapped_column(String, index=True)
+    signal_type: Mapped[Optional[str]] = mapped_column(String)  # "BUY", "SELL", or "HOLD"
+    confidence: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    reason: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    time_generated: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    executed: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+
     # Relationship with trades
-    trades = relationship("Trade", back_populates="signal")
+    trades: Mapped[List["Trade"]] = relationship("Trade", back_populates="signal")
 
 
 class DailyInvestment(Base):
     """Model for tracking daily investments"""
     __tablename__ = "daily_investments"
 
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, unique=True, index=True)
-    amount = Column(Float, default=0.0)
-    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    date: Mapped[Optional[datetime]] = mapped_column(DateTime, unique=True, index=True)
+    amount: Mapped[Optional[float]] = mapped_column(Float, default=0.0)
+
 
 class NewsEvent(Base):
     """Model for tracking news events"""
     __tablename__ = "news_events"
 
-    id = Column(Integer, primary_key=True, index=True)
-    event_time = Column(DateTime, index=True)
-    event_name = Column(String)
-    currency = Column(String, index=True)
-    impact = Column(String)  # "HIGH", "MEDIUM", "LOW"
-    actual = Column(String, nullable=True)
-    forecast = Column(String, nullable=True)
-    previous = Column(String, nullable=True)
-    processed = Column(Boolean, default=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    event_time: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    event_name: Mapped[Optional[str]] = mapped_column(String)
+    currency: Mapped[Optional[str]] = mapped_column(String, index=True)
+    impact: Mapped[Optional[str]] = mapped_column(String)  # "HIGH", "MEDIUM", "LOW"
+    actual: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    forecast: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    previous: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    processed: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
 
 
 class MarketData(Base):
     """Model for storing market data snapshots"""
     __tablename__ = "market_data"
 
-    id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String, index=True)
-    bid = Column(Float)
-    ask = Column(Float)
-    spread = Column(Float)
-    time = Column(DateTime, index=True)
-    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    symbol: Mapped[Optional[str]] = mapped_column(String, index=True)
+    bid: Mapped[Optional[float]] = mapped_column(Float)
+    ask: Mapped[Optional[float]] = mapped_column(Float)
+    spread: Mapped[Optional[float]] = mapped_column(Float)
+    time: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+
     # Additional price information
-    bidhigh = Column(Float, nullable=True)
-    bidlow = Column(Float, nullable=True)
-    askhigh = Column(Float, nullable=True)
-    asklow = Column(Float, nullable=True)
-    
+    bidhigh: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    bidlow: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    askhigh: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    asklow: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
     # Account information
-    balance = Column(Float, nullable=True)
-    equity = Column(Float, nullable=True)
-    margin = Column(Float, nullable=True)
-    margin_free = Column(Float, nullable=True)
-    margin_level = Column(Float, nullable=True)
-    
+    balance: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    equity: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    margin: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    margin_free: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    margin_level: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
     # Profit metrics
-    daily_profit_target = Column(Float, nullable=True)
-    current_daily_profit = Column(Float, nullable=True)
-    profit_target_achieved = Column(Boolean, default=False)
-    
+    daily_profit_target: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    current_daily_profit: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    profit_target_achieved: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+
     # Prediction (can be updated later)
-    predicted_profit = Column(Float, nullable=True)
-    predicted_direction = Column(String, nullable=True)  # "UP", "DOWN", "NEUTRAL"
+    predicted_profit: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    predicted_direction: Mapped[Optional[str]] = mapped_column(String, nullable=True)  # "UP", "DOWN", "NEUTRAL"
+
+    __table_args__ = (
+        # Latest snapshots per symbol
+        Index("ix_market_data_symbol_time", "symbol", "time"),
+    )
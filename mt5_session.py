@@ -0,0 +1,38 @@
+"""
+Shared MetaTrader 5 session for the trading bot.
+Initializes and logs in to the terminal once, reconnecting only when the session is gone.
+"""
+import atexit
+import threading
+import config
+
+_lock = threading.Lock()
+_shutdown_registered = False
+
+def ensure_connected():
+    """Make sure MT5 is initialized and logged in, connecting only if needed.
+
+    Returns:
+        bool: True if a session is available, False if connecting failed.
+    """
+    global _shutdown_registered
+    # MetaTrader5 loads a large native library, so it is imported on first use
+    import MetaTrader5 as mt5
+
+    with _lock:
+        if mt5.terminal_info() is not None:
+            return True
+
+        if not mt5.initialize():
+            print(f"[MT5Session] MT5 failed to initialize! Error code: {mt5.last_error()}")
+            return False
+
+        if not mt5.login(config.MT5_ACCOUNT, password=config.MT5_PASSWORD, server=config.MT5_SERVER):
+            print(f"[MT5Session] MT5 login failed! Error code: {mt5.last_error()}")
+            mt5.shutdown()
+            return False
+
+        if not _shutdown_registered:
+            atexit.register(mt5.shutdown)
+            _shutdown_registered = True
+        return True
@@ -1,11 +1,43 @@
 # news_fetcher.py
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+try:
+    # orjson decodes the calendar payload several times faster when installed
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 import datetime
+import heapq
+import logging
+import random
 import time
+from operator import itemgetter
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+import config
 from typing import List, Dict, Any, Optional, Union
 
+logger = logging.getLogger(__name__)
+
+# One pooled session so repeated fetches reuse the keep-alive TLS connection
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+_SESSION.headers.update({
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "py-trade-bot/1.0",
+})
+
+# Upper bound, in seconds, for the retry backoff before jitter
+_MAX_BACKOFF = 30.0
+
+# The calendar changes a few times a day, so parsed events are reused for this many seconds
+_CALENDAR_TTL = 600
+_calendar_cache = {"ts": 0.0, "events": None, "etag": None, "last_modified": None}
+
 def get_latest_headlines(count: int = 5, max_retries: int = 3) -> str:
     """
     Fetch latest forex calendar events from FairEconomy API.
@@ -20,35 +52,58 @@ def get_latest_headlines(count: int = 5, max_retries: int = 3) -> str:
     """
     url = "https://nfs.faireconomy.media/ff_calendar_thisweek.json"
     
+    # Serve recently fetched events without touching the network
+    cached_events = _calendar_cache["events"]
+    if cached_events is not None and time.monotonic() - _calendar_cache["ts"] < _CALENDAR_TTL:
+        return format_calendar_events(cached_events, count)
+    
+    # Revalidate instead of re-downloading when the server supports it
+    headers = {}
+    if cached_events is not None:
+        if _calendar_cache["etag"]:
+            headers["If-None-Match"] = _calendar_cache["etag"]
+        if _calendar_cache["last_modified"]:
+            headers["If-Modified-Since"] = _calendar_cache["last_modified"]
+    
     # Try multiple times in case of network issues
     for attempt in range(max_retries):
         try:
-            print(f"[NewsFetcher] Attempt {attempt+1}/{max_retries}: Fetching calendar data...")
-            response = requests.get(url, timeout=10)
+            logger.debug("Attempt %d/%d: Fetching calendar data...", attempt + 1, max_retries)
+            response = _SESSION.get(url, timeout=(3.05, 10), headers=headers)  # (connect, read)
+            if response.status_code == 304 and cached_events is not None:
+                # Unchanged since the last fetch, keep the parsed events
+                _calendar_cache["ts"] = time.monotonic()
+                return format_calendar_events(cached_events, count)
             response.raise_for_status()  # Raise exception for 4XX/5XX responses
             
             # Parse JSON data
-            events = response.json()
+            events = _json_loads(response.content)
+            _calendar_cache.update(
+                ts=time.monotonic(),
+                events=events,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
             return format_calendar_events(events, count)
             
-        except requests.exceptions.RequestException as e:
-            print(f"[NewsFetcher] Error fetching calendar data (attempt {attempt+1}): {e}")
-            if attempt < max_retries - 1:
-                delay = 2 ** attempt  # Exponential backoff
-                print(f"[NewsFetcher] Retrying in {delay} seconds...")
-                time.sleep(delay)
-            else:
-                print("[NewsFetcher] All attempts failed.")
-                return generate_mock_headlines()
-        except json.JSONDecodeError as e:
-            print(f"[NewsFetcher] Error parsing JSON data: {e}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # ValueError covers JSON decoding errors
+            logger.warning("Error fetching calendar data (attempt %d): %s", attempt + 1, e)
             if attempt < max_retries - 1:
-                delay = 2 ** attempt
-                print(f"[NewsFetcher] Retrying in {delay} seconds...")
+                # Capped exponential backoff with jitter so clients don't retry in lockstep
+                delay = min(_MAX_BACKOFF, 2 ** attempt) * (0.75 + random.random() * 0.5)
+                logger.info("Retrying in %.1f seconds...", delay)
                 time.sleep(delay)
             else:
-                print("[NewsFetcher] All JSON parsing attempts failed.")
-                return generate_mock_headlines()
+                logger.error("All attempts failed.")
+                return _fallback_headlines(count)
+
+def _fallback_headlines(count: int) -> str:
+    """Serve the last fetched calendar, even if stale, before falling back to mock headlines"""
+    if _calendar_cache["events"] is not None:
+        logger.info("Serving cached calendar data")
+        return format_calendar_events(_calendar_cache["events"], count)
+    return generate_mock_headlines()
 
 def format_calendar_events(events: List[Dict[str, Any]], count: int) -> str:
     """
@@ -68,41 +123,47 @@ def format_calendar_events(events: List[Dict[str, Any]], count: int) -> str:
         now = datetime.datetime.now(datetime.timezone.utc)
     except Exception as e:
         # Fallback to naive datetime if timezone handling fails
-        print(f"[NewsFetcher] Warning: Using naive datetime due to error: {e}")
+        logger.warning("Using naive datetime due to error: %s", e)
         now = datetime.datetime.now()
     
-    # Convert date strings to datetime objects for sorting
-    for event in events:
-        try:
-            # Parse the event date string to datetime
-            event_datetime = event['date']
-            # Remove the Z and replace with UTC offset for proper parsing
-            if event_datetime.endswith('Z'):
-                event_datetime = event_datetime[:-1] + '+00:00'
-            # Parse the ISO format string to a datetime object
-            event['datetime'] = datetime.datetime.fromisoformat(event_datetime)
-            # Calculate how close the event is to now
-            event['time_proximity'] = abs((event['datetime'] - now).total_seconds())
-        except (ValueError, KeyError) as e:
-            # If date parsing fails, put it at the end
-            print(f"[NewsFetcher] Date parsing error: {e} for event: {event.get('title', 'Unknown')}")
-            event['time_proximity'] = float('inf')
-    
     # Define impact priority (High=3, Medium=2, Low=1, None=0)
     impact_priority = {"High": 3, "Medium": 2, "Low": 1, "": 0}
+    priority = impact_priority.get
+    
+    # Only the top `count` events are shown and impact sorts first, so when there are
+    # enough Medium/High events the Low ones can never be picked - skip parsing them
+    important = [event for event in events if priority(event.get('impact', ''), 0) >= 2]
+    if len(important) >= count:
+        events = important
+    
+    # Convert date strings to datetime objects for sorting, parsing all of them in one pass
+    parsed = pd.to_datetime([event.get('date', '') for event in events], utc=True, errors='coerce', format='ISO8601')
+    failed = parsed.isna()
+    # Calculate how close each event is to now, in seconds
+    proximity = np.abs(parsed.asi8 / 1e9 - now.timestamp())
+    # Headlines show times in the bot's configured timezone, like the rest of the app
+    parsed = parsed.tz_convert(config.TIMEZONE)
+    local_now = now.astimezone(ZoneInfo(config.TIMEZONE))
+    for event, event_datetime, is_failed, seconds in zip(events, parsed, failed, proximity):
+        if is_failed:
+            # If date parsing fails, put it at the end
+            logger.debug("Date parsing error: %r for event: %s", event.get('date'), event.get('title', 'Unknown'))
+            event['time_proximity'] = float('inf')
+        else:
+            event['datetime'] = event_datetime.to_pydatetime()
+            event['time_proximity'] = float(seconds)
+        # Sort key: impact (highest first), then proximity to current time
+        event['_rank'] = (-priority(event.get('impact', ''), 0), event['time_proximity'])
     
-    # Sort events by impact (highest first), then by proximity to current time
-    sorted_events = sorted(
-        events,
-        key=lambda x: (-impact_priority.get(x.get('impact', ''), 0), x.get('time_proximity', float('inf')))
-    )
+    # Pick the top events by their precomputed rank without sorting the whole week
+    top_events = heapq.nsmallest(count, events, key=itemgetter('_rank'))
     
     # Format headlines
     headlines = []
-    for event in sorted_events[:count]:
+    for event in top_events:
         try:
             # Format date to a readable string
-            event_date = event.get('datetime', now).strftime("%Y-%m-%d %H:%M")
+            event_date = event.get('datetime', local_now).strftime("%Y-%m-%d %H:%M")
             
             # Create a formatted headline
             impact = f"[{event.get('impact', 'Unknown')} Impact]" if event.get('impact') else ""
@@ -116,17 +177,17 @@ def format_calendar_events(events: List[Dict[str, Any]], count: int) -> str:
             headline = f"{event_date} - {' '.join(headline_parts)}"
             
             headlines.append(headline)
-            print(f"[NewsFetcher] Formatted headline: {headline}")
+            logger.debug("Formatted headline: %s", headline)
             
         except Exception as e:
-            print(f"[NewsFetcher] Error formatting event: {e}")
+            logger.debug("Error formatting event: %s", e)
             continue
     
     # If we couldn't get enough headlines from the calendar
     if not headlines:
         return generate_mock_headlines()
     
-    print(f"[NewsFetcher] Returning {len(headlines)} formatted headlines")
+    logger.info("Returning %d formatted headlines", len(headlines))
     return "\n".join(headlines)
 
 def generate_mock_headlines() -> str:
@@ -136,7 +197,7 @@ def generate_mock_headlines() -> str:
     Returns:
         String with newline-separated mock headlines
     """
-    print("[NewsFetcher] Generating mock headlines due to fetch/parse failure")
+    logger.warning("Generating mock headlines due to fetch/parse failure")
     mock_headlines = [
         f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M')} - [USD] [High Impact] FOMC Statement - Rate decision expected",
         f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M')} - [EUR] [Medium Impact] German Factory Orders m/m Forecast: 0.8% Previous: -2.1%",
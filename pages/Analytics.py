@@ -6,11 +6,10 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-import pytz
-from datetime import datetime
-from db_config import SessionLocal
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, func
+from db_config import get_session
 from models import Trade, Signal, MarketData
-from timezone_utils import convert_utc_to_local, format_datetime
 import config
 from dashboard_components import (
     create_profit_by_pair_chart,
@@ -27,89 +26,149 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load data
-@st.cache_data(ttl=10)
-def load_trade_data():
-    """Load trade data from the database"""
-    db = SessionLocal()
-    try:
-        # Get all trades
-        trades = db.query(Trade).all()
-        # Convert to DataFrame
-        if trades:
-            data = [{
-                "id": t.id,
-                "ticket": t.ticket,
-                "symbol": t.symbol,
-                "type": t.type,
-                "volume": t.volume,
-                "price_open": t.price_open,
-                "price_close": t.price_close,
-                "profit": t.profit,
-                # Convert UTC timestamps to user's timezone
-                "time_open": format_datetime(convert_utc_to_local(t.time_open)),
-                "time_close": format_datetime(convert_utc_to_local(t.time_close)) if t.time_close else None,
-                "time_open_raw": t.time_open,  # Keep raw datetime for filtering
-                "time_close_raw": t.time_close,  # Keep raw datetime for filtering
-                "is_active": t.is_active
-            } for t in trades]
-            return pd.DataFrame(data)
-        return pd.DataFrame()
-    finally:
-        db.close()
+# At most this many of the newest snapshots in the date range are loaded; the page
+# says so when older ones are left out
+MARKET_DATA_LIMIT = getattr(config, 'ANALYTICS_MARKET_DATA_LIMIT', 5000)
+
+# Data loaders are keyed on per-table watermarks (see load_watermarks), so they
+# can be kept for long; the watermarks themselves are re-checked often
+WATERMARK_TTL = 2
+DATA_TTL = 300
+
+# Load data - the loaders share the caller's session (leading underscore keeps
+# it out of the st.cache_data key)
+def _local_strings(utc_series):
+    """Format a UTC datetime column in the user's timezone in one vectorized pass.
+    
+    Called at render time on the rows actually displayed.
+    """
+    return utc_series.dt.tz_convert(config.TIMEZONE).dt.strftime("%Y-%m-%d %H:%M:%S %Z")
+
+def _date_conditions(column, start_date=None, end_date=None):
+    """WHERE conditions keeping rows whose (UTC) date is within [start_date, end_date]"""
+    conditions = []
+    if start_date is not None:
+        conditions.append(column >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        conditions.append(column < datetime.combine(end_date + timedelta(days=1), time.min))
+    return conditions
 
-@st.cache_data(ttl=10)
-def load_signal_data():
-    """Load signal data from the database"""
-    db = SessionLocal()
-    try:
-        signals = db.query(Signal).all()
-        if signals:
-            data = [{
-                "id": s.id,
-                "symbol": s.symbol,
-                "signal_type": s.signal_type,
-                "confidence": s.confidence,
-                "reason": s.reason,
-                # Convert UTC timestamp to user's timezone
-                "timestamp": format_datetime(convert_utc_to_local(s.time_generated)),
-                "timestamp_raw": s.time_generated,  # Keep raw datetime for filtering
-                "executed": s.executed
-            } for s in signals]
-            return pd.DataFrame(data)
+@st.cache_data(ttl=WATERMARK_TTL)
+def load_watermarks(_db):
+    """Get a cheap change marker for each table.
+    
+    Passing these to the loaders makes an unchanged marker a cache hit, so
+    the full frames are only re-read when rows were added or updated.
+    """
+    trades = _db.execute(select(
+        func.count(Trade.id), func.max(Trade.time_open), func.max(Trade.time_close), func.sum(Trade.profit)
+    )).one()
+    signals = _db.execute(select(
+        func.max(Signal.id), func.count(Signal.id).filter(Signal.executed == True)
+    )).one()
+    market = _db.scalar(select(func.max(MarketData.id)))
+    return tuple(trades), tuple(signals), market
+
+@st.cache_data(ttl=DATA_TTL)
+def load_trade_date_bounds(_db, watermark):
+    """Get the first and last trade open times, computed by the database"""
+    return tuple(_db.execute(select(func.min(Trade.time_open), func.max(Trade.time_open))).one())
+
+@st.cache_data(ttl=DATA_TTL)
+def load_trade_symbols(_db, watermark):
+    """Get the distinct traded symbols, computed by the database"""
+    return list(_db.scalars(select(Trade.symbol).distinct().order_by(Trade.symbol)))
+
+@st.cache_data(ttl=DATA_TTL)
+def load_trade_data(_db, watermark, start_date=None, end_date=None, symbol="All", trade_type="All", status="All"):
+    """Load the trades matching the sidebar filters from the database.
+    
+    Filters are applied in SQL, and st.cache_data keys on their values so each
+    filter combination is cached separately.
+    """
+    # Only the columns the page uses, as plain rows
+    query = select(
+        Trade.id, Trade.ticket, Trade.symbol, Trade.type, Trade.volume,
+        Trade.price_open, Trade.price_close, Trade.profit,
+        Trade.time_open, Trade.time_close, Trade.is_active
+    ).where(*_date_conditions(Trade.time_open, start_date, end_date))
+    if symbol != "All":
+        query = query.where(Trade.symbol == symbol)
+    if trade_type != "All":
+        query = query.where(Trade.type == trade_type)
+    if status == "Active":
+        query = query.where(Trade.is_active == True)
+    elif status == "Closed":
+        query = query.where(Trade.is_active.is_not(True))
+    # Pull the trades column-wise straight into a DataFrame
+    trades_df = pd.read_sql_query(
+        query, _db.connection(),
+        parse_dates={"time_open": {"utc": True}, "time_close": {"utc": True}}
+    )
+    if trades_df.empty:
         return pd.DataFrame()
-    finally:
-        db.close()
+    # Raw UTC datetimes only; display strings are formatted at render time
+    trades_df = trades_df.rename(columns={"time_open": "time_open_raw", "time_close": "time_close_raw"})
+    # Low-cardinality filter columns: equality tests compare integer codes
+    trades_df["symbol"] = trades_df["symbol"].astype("category")
+    trades_df["type"] = trades_df["type"].astype("category")
+    trades_df["is_active"] = trades_df["is_active"].fillna(False).astype(bool)
+    return trades_df
 
-@st.cache_data(ttl=10)
-def load_market_data():
-    """Load market data snapshots from the database with timezone conversion"""
-    db = SessionLocal()
-    try:
-        market_data = db.query(MarketData).order_by(MarketData.time.desc()).all()
-        if market_data:
-            data = [{
-                "id": md.id,
-                "symbol": md.symbol,
-                "bid": md.bid,
-                "ask": md.ask,
-                "spread": md.spread,
-                # Convert UTC time to local timezone for display
-                "time": format_datetime(convert_utc_to_local(md.time)),
-                "time_raw": md.time,  # Keep raw time for filtering
-                "balance": md.balance,
-                "equity": md.equity,
-                "margin": md.margin,
-                "daily_profit_target": md.daily_profit_target,
-                "current_daily_profit": md.current_daily_profit,
-                "profit_target_achieved": "ACHIEVED" if md.profit_target_achieved else "NOT YET ACHIEVED",
-                "predicted_profit": md.predicted_profit,
-                "predicted_direction": md.predicted_direction
-            } for md in market_data]
-            return pd.DataFrame(data)
+@st.cache_data(ttl=DATA_TTL)
+def load_signal_data(_db, watermark, start_date=None, end_date=None):
+    """Load signal data within the date range from the database"""
+    signals_df = pd.read_sql_query(
+        select(
+            Signal.id, Signal.symbol, Signal.signal_type, Signal.confidence, Signal.reason,
+            Signal.time_generated, Signal.executed
+        ).where(*_date_conditions(Signal.time_generated, start_date, end_date)),
+        _db.connection(),
+        parse_dates={"time_generated": {"utc": True}}
+    )
+    if signals_df.empty:
         return pd.DataFrame()
-    finally:
-        db.close()
+    return signals_df.rename(columns={"time_generated": "timestamp_raw"})
+
+@st.cache_data(ttl=DATA_TTL)
+def load_signal_type_counts(_db, watermark, start_date=None, end_date=None):
+    """Count signals per type within the date range, grouped by the database"""
+    rows = _db.execute(
+        select(Signal.signal_type, func.count(Signal.id))
+        .where(*_date_conditions(Signal.time_generated, start_date, end_date))
+        .group_by(Signal.signal_type)
+    ).all()
+    return [signal_type for signal_type, _ in rows], [count for _, count in rows]
+
+@st.cache_data(ttl=DATA_TTL)
+def load_market_data(_db, watermark, start_date=None, end_date=None):
+    """Load the latest market data snapshots within the date range from the database.
+    
+    Returns:
+        tuple: (DataFrame of at most MARKET_DATA_LIMIT snapshots, True if older ones were left out)
+    """
+    market_df = pd.read_sql_query(
+        select(
+            MarketData.id, MarketData.symbol, MarketData.bid, MarketData.ask, MarketData.spread,
+            MarketData.time, MarketData.balance, MarketData.equity, MarketData.margin,
+            MarketData.daily_profit_target, MarketData.current_daily_profit,
+            MarketData.profit_target_achieved, MarketData.predicted_profit, MarketData.predicted_direction
+        )
+        .where(*_date_conditions(MarketData.time, start_date, end_date))
+        .order_by(MarketData.time.desc())
+        .limit(MARKET_DATA_LIMIT + 1),
+        _db.connection(),
+        parse_dates={"time": {"utc": True}}
+    )
+    if market_df.empty:
+        return pd.DataFrame(), False
+    # One row past the limit tells whether the range was cut short
+    truncated = len(market_df) > MARKET_DATA_LIMIT
+    market_df = market_df.head(MARKET_DATA_LIMIT).rename(columns={"time": "time_raw"})
+    market_df["profit_target_achieved"] = market_df["profit_target_achieved"].eq(True).map(
+        {True: "ACHIEVED", False: "NOT YET ACHIEVED"}
+    )
+    return market_df, truncated
 
 def main():
     """Main function for analytics page"""
@@ -118,22 +177,21 @@ def main():
     # Show current timezone
     st.caption(f"All timestamps displayed in {config.TIMEZONE} timezone")
     
-    # Load data
-    trades_df = load_trade_data()
-    signals_df = load_signal_data()
-    market_df = load_market_data()
-    
-    if trades_df.empty:
-        st.info("No trade data available for analysis")
-        return
-    
-    # Filter options
-    st.sidebar.header("Filter Options")
-    
-    # Date range filter
-    if not trades_df.empty:
-        min_date = pd.to_datetime(trades_df['time_open_raw']).min().date()
-        max_date = pd.to_datetime(trades_df['time_open_raw']).max().date()
+    # Load data over a single pooled session; the filter options come from
+    # small SQL aggregates and the filters themselves run in SQL
+    with get_session() as db:
+        trades_mark, signals_mark, market_mark = load_watermarks(db)
+        min_time, max_time = load_trade_date_bounds(db, trades_mark)
+        if min_time is None:
+            st.info("No trade data available for analysis")
+            return
+        
+        # Filter options
+        st.sidebar.header("Filter Options")
+        
+        # Date range filter
+        min_date = min_time.date()
+        max_date = max_time.date()
         
         date_range = st.sidebar.date_input(
             "Select Date Range",
@@ -141,39 +199,24 @@ def main():
             min_value=min_date,
             max_value=max_date
         )
+        start_date, end_date = date_range if len(date_range) == 2 else (None, None)
         
-        if len(date_range) == 2:
-            start_date, end_date = date_range
-            trades_df = trades_df[
-                (pd.to_datetime(trades_df['time_open_raw']).dt.date >= start_date) &
-                (pd.to_datetime(trades_df['time_open_raw']).dt.date <= end_date)
-            ]
-    
-    # Symbol filter
-    if not trades_df.empty:
-        symbols = ["All"] + list(trades_df['symbol'].unique())
+        # Symbol filter
+        symbols = ["All"] + load_trade_symbols(db, trades_mark)
         selected_symbol = st.sidebar.selectbox("Select Symbol", symbols)
         
-        if selected_symbol != "All":
-            trades_df = trades_df[trades_df['symbol'] == selected_symbol]
-    
-    # Trade type filter
-    if not trades_df.empty:
+        # Trade type filter
         trade_types = ["All", "BUY", "SELL"]
         selected_type = st.sidebar.selectbox("Trade Type", trade_types)
         
-        if selected_type != "All":
-            trades_df = trades_df[trades_df['type'] == selected_type]
-    
-    # Active/Closed filter
-    if not trades_df.empty:
+        # Active/Closed filter
         trade_status = ["All", "Active", "Closed"]
         selected_status = st.sidebar.selectbox("Trade Status", trade_status)
         
-        if selected_status == "Active":
-            trades_df = trades_df[trades_df['is_active'] == True]
-        elif selected_status == "Closed":
-            trades_df = trades_df[trades_df['is_active'] == False]
+        trades_df = load_trade_data(db, trades_mark, start_date, end_date, selected_symbol, selected_type, selected_status)
+        signals_df = load_signal_data(db, signals_mark, start_date, end_date)
+        signal_types, signal_type_counts = load_signal_type_counts(db, signals_mark, start_date, end_date)
+        market_df, market_truncated = load_market_data(db, market_mark, start_date, end_date)
     
     # Display metrics and charts
     col1, col2 = st.columns([1, 3])
@@ -186,22 +229,23 @@ def main():
         metrics_cols = st.columns(4)
         
         if not trades_df.empty:
+            # Count, mean and sum of profit in one pass
+            stats = trades_df['profit'].agg(['size', 'mean', 'sum'])
+            
             # Total trades
-            metrics_cols[0].metric("Total Trades", len(trades_df))
+            metrics_cols[0].metric("Total Trades", int(stats['size']))
             
             # Average profit
-            avg_profit = trades_df['profit'].mean() if len(trades_df) > 0 else 0
+            avg_profit = stats['mean'] if pd.notna(stats['mean']) else 0
             metrics_cols[1].metric("Avg. Profit per Trade", f"${avg_profit:.2f}")
             
             # Win rate (for closed trades)
-            closed_trades = trades_df[trades_df['is_active'] == False]
-            winning_trades = closed_trades[closed_trades['profit'] > 0]
-            win_rate = len(winning_trades) / len(closed_trades) * 100 if len(closed_trades) > 0 else 0
+            closed_profit = trades_df.loc[~trades_df['is_active'], 'profit']
+            win_rate = (closed_profit > 0).mean() * 100 if len(closed_profit) > 0 else 0
             metrics_cols[2].metric("Win Rate", f"{win_rate:.2f}%")
             
             # Total profit
-            total_profit = trades_df['profit'].sum()
-            metrics_cols[3].metric("Total Profit", f"${total_profit:.2f}")
+            metrics_cols[3].metric("Total Profit", f"${stats['sum']:.2f}")
     
     # Charts
     st.subheader("Performance Analysis")
@@ -238,8 +282,17 @@ def main():
     # Detailed trade data
     st.subheader("Trade History")
     if not trades_df.empty:
+        # Format times only for the rows being displayed
+        history_df = trades_df.sort_values('time_open_raw', ascending=False)
+        history_df = history_df.assign(
+            time_open=_local_strings(history_df['time_open_raw']),
+            time_close=_local_strings(history_df['time_close_raw'])
+        )
         st.dataframe(
-            trades_df.sort_values('time_open', ascending=False),
+            history_df[[
+                "id", "ticket", "symbol", "type", "volume", "price_open", "price_close", "profit",
+                "time_open", "time_close", "time_open_raw", "time_close_raw", "is_active"
+            ]],
             use_container_width=True,
             column_config={
                 "profit": st.column_config.NumberColumn(
@@ -259,21 +312,10 @@ def main():
     # Signal analysis
     st.subheader("Signal Analysis")
     if not signals_df.empty:
-        # Filter signals based on date range if set
-        if len(date_range) == 2:
-            start_date, end_date = date_range
-            signals_df = signals_df[
-                (pd.to_datetime(signals_df['timestamp_raw']).dt.date >= start_date) &
-                (pd.to_datetime(signals_df['timestamp_raw']).dt.date <= end_date)
-            ]
-        
-        # Count signals by type
-        signal_counts = signals_df['signal_type'].value_counts()
-        
-        # Create pie chart
+        # Create pie chart from the per-type counts grouped in SQL
         fig = px.pie(
-            names=signal_counts.index,
-            values=signal_counts.values,
+            names=signal_types,
+            values=signal_type_counts,
             title="Signal Distribution by Type"
         )
         
@@ -286,8 +328,10 @@ def main():
         st.metric("Signal Execution Rate", f"{execution_rate:.2f}%")
         
         # Display signals
+        recent_signals_df = signals_df.sort_values('timestamp_raw', ascending=False)
+        recent_signals_df.insert(5, 'timestamp', _local_strings(recent_signals_df['timestamp_raw']))
         st.dataframe(
-            signals_df.sort_values('timestamp', ascending=False),
+            recent_signals_df,
             use_container_width=True,
             hide_index=True
         )
@@ -296,15 +340,12 @@ def main():
         
     # Market Data Analysis
     st.subheader("Market Data Snapshots")
+    if market_truncated:
+        st.warning(
+            f"Showing the newest {MARKET_DATA_LIMIT} snapshots only; "
+            "narrow the date range to see earlier ones."
+        )
     if not market_df.empty:
-        # Filter market data based on date range if set
-        if 'date_range' in locals() and len(date_range) == 2:
-            start_date, end_date = date_range
-            market_df = market_df[
-                (pd.to_datetime(market_df['time_raw']).dt.date >= start_date) &
-                (pd.to_datetime(market_df['time_raw']).dt.date <= end_date)
-            ]
-            
         # Profit Target Tracking
         st.markdown("### Profit Target Analysis")
         
@@ -336,19 +377,16 @@ def main():
             if len(market_df) > 1:
                 st.markdown("#### Daily Profit Progression")
                 
-                # Convert time to datetime for plotting
-                plot_df = market_df.copy()
-                plot_df['time_dt'] = pd.to_datetime(plot_df['time_raw'], utc=True).dt.tz_convert(config.TIMEZONE)
-                
-                # Sort by time
-                plot_df = plot_df.sort_values('time_dt')
+                # Sort just the plotted columns by time and convert for the x axis
+                plot_df = market_df[['time_raw', 'current_daily_profit', 'daily_profit_target']].sort_values('time_raw')
+                x = plot_df['time_raw'].dt.tz_convert(config.TIMEZONE)
                 
                 # Create plot
                 fig = go.Figure()
                 
                 # Add profit line
                 fig.add_trace(go.Scatter(
-                    x=plot_df['time_dt'],
+                    x=x,
                     y=plot_df['current_daily_profit'],
                     mode='lines+markers',
                     name='Daily Profit'
@@ -356,7 +394,7 @@ def main():
                 
                 # Add target line
                 fig.add_trace(go.Scatter(
-                    x=plot_df['time_dt'],
+                    x=x,
                     y=plot_df['daily_profit_target'],
                     mode='lines',
                     name='Target',
@@ -386,8 +424,10 @@ def main():
                 'profit_target_achieved', 'predicted_profit'
             ]
             
+            history_df = market_df.sort_values('time_raw', ascending=False)
+            history_df = history_df.assign(time=_local_strings(history_df['time_raw']))
             st.dataframe(
-                market_df[display_cols].sort_values('time_raw', ascending=False),
+                history_df[display_cols],
                 use_container_width=True,
                 hide_index=True
             )
@@ -5,9 +5,22 @@ This page allows configuration of bot parameters and system settings.
 import streamlit as st
 import os
 import json
+try:
+    # orjson encodes and decodes the settings several times faster when installed
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj):
+        return json.dumps(obj, indent=2)
+    _json_loads = json.loads
+import re
+import shutil
 import time
-import pytz
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 import config
 from dashboard_components import display_system_status
@@ -19,15 +32,98 @@ st.set_page_config(
     layout="wide"
 )
 
+# Choices offered by the settings widgets
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "NZDUSD", "USDCHF"]
+REGIONS = ["India", "US", "UK", "Europe", "Japan", "Australia", "Other"]
+REGION_TIMEZONES = {
+    "India": ["Asia/Kolkata"],
+    "US": ["US/Eastern", "US/Central", "US/Mountain", "US/Pacific", "US/Alaska", "US/Hawaii"],
+    "UK": ["Europe/London"],
+    "Europe": ["Europe/Paris", "Europe/Berlin", "Europe/Madrid", "Europe/Rome", "Europe/Amsterdam", "Europe/Zurich"],
+    "Japan": ["Asia/Tokyo"],
+    "Australia": ["Australia/Sydney", "Australia/Melbourne", "Australia/Perth", "Australia/Brisbane"],
+    "Other": ["UTC", "Etc/GMT"]
+}
+
+# Option -> position maps for the selectbox defaults, built once at import
+SYMBOL_INDEX = {symbol: i for i, symbol in enumerate(SYMBOLS)}
+REGION_INDEX = {region: i for i, region in enumerate(REGIONS)}
+REGION_TIMEZONE_INDEX = {
+    region: {tz: i for i, tz in enumerate(timezones)}
+    for region, timezones in REGION_TIMEZONES.items()
+}
+
+@lru_cache(maxsize=8)
+def _option_index(options):
+    """Option -> position map for a selectbox whose options come from settings"""
+    return {option: i for i, option in enumerate(options)}
+
+@st.cache_resource
+def _timezone(name):
+    """Look up a timezone once per process instead of on every rerun"""
+    # Only the Region tab needs pytz, so it is imported on first use
+    import pytz
+    return pytz.timezone(name)
+
+@st.cache_data
+def _read_text(path, mtime):
+    """Read a text file; keyed on its mtime so it is re-read only after it changes"""
+    return Path(path).read_text()
+
+# Matches a top-level "NAME = value" assignment line in config.py
+_CONFIG_ASSIGNMENT = re.compile(r'([A-Z_][A-Z0-9_]*)\s*=\s*(.*)')
+
+def _format_config_value(key, value):
+    """Render a setting as a Python literal for config.py"""
+    # Special handling for different types of values
+    if isinstance(value, str):
+        if key in ['system_prompt']:
+            # Multi-line string with proper indentation for system prompt
+            return f'"""{value}\n"""'
+        # Regular string with quotes
+        return f'"{value}"'
+    return str(value)
+
+def _rewrite_config(config_content, settings_dict):
+    """Replace the assignments of all given settings in a single pass over config.py"""
+    # Convert keys to uppercase for config.py format
+    replacements = {key.upper(): _format_config_value(key, value) for key, value in settings_dict.items()}
+    lines = []
+    in_old_value = False
+    for line in config_content.splitlines(keepends=True):
+        if in_old_value:
+            # Drop the rest of a replaced multi-line string
+            if '"""' in line:
+                in_old_value = False
+            continue
+        match = _CONFIG_ASSIGNMENT.match(line)
+        value = replacements.get(match.group(1)) if match else None
+        if value is not None:
+            lines.append(f"{match.group(1)} = {value}\n")
+            in_old_value = match.group(2).count('"""') == 1
+        else:
+            lines.append(line)
+    return "".join(lines)
+
+def _atomic_write(path, content):
+    """Write a file in one buffered write to a temp file, then swap it into place.
+    
+    Readers see either the old file or the complete new one, never a partial write.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', buffering=1 << 16) as f:
+        f.write(content)
+        f.flush()
+        # One explicit sync per file so the new contents are on disk before the swap
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 def backup_config():
     """Create a backup of the current config.py file"""
-    import shutil
-    import datetime
-    
     try:
         config_path = Path("config.py")
         if config_path.exists():
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_path = Path(f"config_backup_{timestamp}.py")
             
             # Create backup
@@ -46,49 +142,24 @@ def save_settings(settings_dict):
         # First create a backup of the config file
         backup_success, backup_path = backup_config()
         
-        # Save to JSON
-        with open(settings_path, 'w') as f:
-            json.dump(settings_dict, f, indent=2)
-        
-        # Update config.py file
+        # Prepare the new JSON and config.py contents
+        writes = [(settings_path, _json_dumps(settings_dict))]
         config_path = Path("config.py")
-        if config_path.exists():
+        config_found = config_path.exists()
+        if config_found:
             # Read existing config file
             with open(config_path, 'r') as f:
                 config_content = f.read()
             
-            # Update the values one by one
-            for key, value in settings_dict.items():
-                # Convert key to uppercase for config.py format
-                config_key = key.upper()
-                
-                # Special handling for different types of values
-                if isinstance(value, str):
-                    if key in ['system_prompt']:
-                        # Multi-line string with proper indentation for system prompt
-                        new_value = f'"""{value}\n"""'
-                    else:
-                        # Regular string with quotes
-                        new_value = f'"{value}"'
-                elif isinstance(value, bool):
-                    new_value = str(value)
-                elif isinstance(value, (int, float)):
-                    new_value = str(value)
-                else:
-                    new_value = str(value)
-                
-                # Replace in config file using regex pattern matching
-                import re
-                pattern = rf'^{config_key}\s*=\s*.*$'
-                replacement = f'{config_key} = {new_value}'
-                
-                # Use regex with multiline mode to match entire lines
-                config_content = re.sub(pattern, replacement, config_content, flags=re.MULTILINE)
-            
-            # Write updated config back to file
-            with open(config_path, 'w') as f:
-                f.write(config_content)
-            
+            # Update all values in one pass
+            writes.append((config_path, _rewrite_config(config_content, settings_dict)))
+        
+        # Write every file in one go
+        for path, content in writes:
+            _atomic_write(path, content)
+        load_settings.clear()
+        
+        if config_found:
             result = {
                 "success": True,
                 "backup": {
@@ -104,12 +175,12 @@ def save_settings(settings_dict):
         print(error_msg)
         return {"success": False, "error": error_msg}
 
+@st.cache_data(ttl=30)
 def load_settings():
-    """Load settings from JSON file if it exists"""
+    """Load settings from JSON file if it exists (cached; cleared by save_settings)"""
     settings_path = Path("bot_settings.json")
     if settings_path.exists():
-        with open(settings_path, 'r') as f:
-            return json.load(f)
+        return _json_loads(settings_path.read_bytes())
     return {}
 
 def reset_to_defaults():
@@ -244,8 +315,7 @@ DB_USER={db_user}
 DB_PASSWORD={db_password}
 """
             try:
-                with open(".env", "w") as f:
-                    f.write(env_content)
+                _atomic_write(".env", env_content)
                 st.success("✅ .env file generated successfully!")
                 st.code(env_content, language="bash")
             except Exception as e:
@@ -318,7 +388,7 @@ DB_PASSWORD={db_password}
         selected_model = st.selectbox(
             "LLM Model",
             models,
-            index=models.index(settings.get('together_model', config.TOGETHER_MODEL)) if hasattr(config, 'TOGETHER_MODEL') and config.TOGETHER_MODEL in models else 0,
+            index=_option_index(tuple(models)).get(settings.get('together_model', getattr(config, 'TOGETHER_MODEL', None)), 0),
             help="AI model to use for trading decisions",
             key="model_selection_input"
         )
@@ -340,11 +410,10 @@ DB_PASSWORD={db_password}
         
         with col1:
             # Symbol selection
-            symbols = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "NZDUSD", "USDCHF"]
             symbol = st.selectbox(
                 "Trading Symbol", 
-                symbols, 
-                index=symbols.index(settings.get('symbol', config.SYMBOL)) if hasattr(config, 'SYMBOL') and config.SYMBOL in symbols else 0,
+                SYMBOLS, 
+                index=SYMBOL_INDEX.get(settings.get('symbol', getattr(config, 'SYMBOL', None)), 0),
                 help="Primary currency pair for trading",
                 key="symbol_selection_input"
             )
@@ -399,43 +468,30 @@ DB_PASSWORD={db_password}
         st.header("Region & Timezone Settings")
         
         # Region selection
-        regions = ["India", "US", "UK", "Europe", "Japan", "Australia", "Other"]
         selected_region = st.selectbox(
             "Region",
-            regions,
-            index=regions.index(settings.get('region', config.REGION)) if hasattr(config, 'REGION') and config.REGION in regions else 0,
+            REGIONS,
+            index=REGION_INDEX.get(settings.get('region', getattr(config, 'REGION', None)), 0),
             help="Select your geographic region",
             key="region_selection_input"
         )
         
-        # Get timezones based on region
-        region_timezones = {
-            "India": ["Asia/Kolkata"],
-            "US": ["US/Eastern", "US/Central", "US/Mountain", "US/Pacific", "US/Alaska", "US/Hawaii"],
-            "UK": ["Europe/London"],
-            "Europe": ["Europe/Paris", "Europe/Berlin", "Europe/Madrid", "Europe/Rome", "Europe/Amsterdam", "Europe/Zurich"],
-            "Japan": ["Asia/Tokyo"],
-            "Australia": ["Australia/Sydney", "Australia/Melbourne", "Australia/Perth", "Australia/Brisbane"],
-            "Other": ["UTC", "Etc/GMT"]
-        }
-        
         # Filter timezones by region
-        available_timezones = region_timezones.get(selected_region, ["UTC"])
+        available_timezones = REGION_TIMEZONES.get(selected_region, ["UTC"])
         
         # Timezone selection
         selected_timezone = st.selectbox(
             "Timezone",
             available_timezones,
-            index=available_timezones.index(settings.get('timezone', config.TIMEZONE)) 
-                if hasattr(config, 'TIMEZONE') and config.TIMEZONE in available_timezones 
-                else 0,
+            index=REGION_TIMEZONE_INDEX.get(selected_region, {}).get(
+                settings.get('timezone', getattr(config, 'TIMEZONE', None)), 0),
             help="Select your timezone for date/time displays",
             key="timezone_selection_input"
         )
         
         # Show current time in selected timezone
         try:
-            current_time = datetime.now(pytz.timezone(selected_timezone))
+            current_time = datetime.now(_timezone(selected_timezone))
             st.info(f"Current time in {selected_timezone}: {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
         except Exception as e:
             st.error(f"Error displaying time: {str(e)}")
@@ -475,14 +531,17 @@ DB_PASSWORD={db_password}
         # View raw settings
         st.subheader("View Raw Settings")
         if st.checkbox("Show Raw Settings JSON", key="show_raw"):
-            st.code(json.dumps(settings, indent=2), language="json")
+            settings_path = Path("bot_settings.json")
+            if settings_path.exists():
+                st.code(_read_text(settings_path, settings_path.stat().st_mtime), language="json")
+            else:
+                st.code(_json_dumps(settings), language="json")
             
         # View config.py content
         st.subheader("View config.py Content")
         if st.checkbox("Show config.py Content", key="show_config"):
             try:
-                with open("config.py", "r") as f:
-                    config_content = f.read()
+                config_content = _read_text("config.py", os.path.getmtime("config.py"))
                 st.code(config_content, language="python")
             except Exception as e:
                 st.error(f"Error reading config.py: {str(e)}")
@@ -1,23 +1,47 @@
 # risk_guard.py
 
-from together import Together
+import logging
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import config
+import llm_cache
+import llm_client
+import mt5_session
 import news_fetcher
 import trade_executor
-import MetaTrader5 as mt5
 
-client = Together(api_key=config.TOGETHER_API_KEY)
+logger = logging.getLogger(__name__)
 
-def check_news_risk():
-    """Check news for risk and handle trades accordingly.
-    
-    Returns:
-        bool: True if high risk detected (trades should close), False otherwise.
-    """
-    try:
-        latest_news = news_fetcher.get_latest_headlines()
+# "YES" anywhere in the first three words of the answer, in any case
+_YES_RE = re.compile(r'\s*(?:\S+\s+){0,2}\S*YES', re.IGNORECASE)
+
+# Compact per-position record for the post-action trade stats
+TradeInfo = namedtuple("TradeInfo", "ticket type volume price_open profit time")
+
+# One worker so the LLM request can overlap the MT5 position fetch
+_llm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="risk-llm")
+
+# Deadline for the whole background job: headline fetch (with retries) plus the LLM call
+RISK_CHECK_TIMEOUT_SECONDS = getattr(config, 'RISK_CHECK_TIMEOUT_SECONDS', 60)
 
-        prompt = f"""
+# Risk job still running from a check that timed out, reused instead of queuing another
+_inflight = None
+
+# Last (monotonic time, decision), reused while there are no open trades to protect
+DECISION_TTL = getattr(config, 'CHECK_INTERVAL_SECONDS', 300)
+_last_decision = None
+
+def _fresh_decision():
+    """Return the last risk decision if it is younger than DECISION_TTL, else None"""
+    if _last_decision is not None and time.monotonic() - _last_decision[0] < DECISION_TTL:
+        return _last_decision[1]
+    return None
+
+def build_risk_prompt(latest_news):
+    """Build the close-all-trades question for the given headlines"""
+    return f"""
         Headlines:
         {latest_news}
 
@@ -25,82 +49,133 @@ def check_news_risk():
         Answer 'YES' if there is high risk or bad news, else 'NO'.
         """
 
-        print(prompt)
+def parse_risk_decision(result):
+    """Return True if the LLM answer says to close trades"""
+    return bool(_YES_RE.match(result))
+
+def _ask_risk_llm():
+    """Ask the LLM whether the latest headlines call for closing all trades"""
+    latest_news = news_fetcher.get_latest_headlines()
+
+    prompt = build_risk_prompt(latest_news)
+    logger.debug("Risk prompt: %s", prompt)
+
+    # Same headlines within the TTL get the same answer without an API call
+    cache_key = llm_cache.make_key(config.TOGETHER_MODEL, prompt)
+    result = llm_cache.get_cached(cache_key)
+    if result is None:
+        response = llm_client.get_client().chat.completions.create(
+            model=config.TOGETHER_MODEL,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        # Don't print entire response object, only the content
+        result = response.choices[0].message.content if response.choices else ""
+        llm_cache.store(cache_key, result)
+    return result
+
+def check_news_risk(answer=None, report_changes=False):
+    """Check news for risk and handle trades accordingly.
+    
+    Args:
+        answer (str): LLM answer to the risk prompt if it was already asked
+            (e.g. batched with the signal prompt); asked here when None.
+        report_changes (bool): Also report whether a trade action changed the positions
+    
+    Returns:
+        bool: True if high risk detected (trades should close), False otherwise.
+        With report_changes, a (decision, positions_changed) tuple instead.
+    """
+    decision, mutated = _check_news_risk(answer)
+    return (decision, mutated) if report_changes else decision
+
+def _submit_risk_llm():
+    """Start a risk job, or reuse one an earlier check gave up waiting for"""
+    global _inflight
+    if _inflight is None or _inflight.done():
+        _inflight = _llm_pool.submit(_ask_risk_llm)
+    return _inflight
 
+def _check_news_risk(answer):
+    """check_news_risk's work, returning (decision, positions_changed)"""
+    global _last_decision
+    mutated = False
+    try:
+        decision = None
+        cached = _fresh_decision() if answer is None else None
+        # Ask the LLM in the background while the MT5 positions are fetched,
+        # unless a recent decision may make the call unnecessary
+        pending = _submit_risk_llm() if answer is None and cached is None else None
+
+        # Reuse the shared MT5 session, connecting only if it is not up
+        positions = None
         try:
-            response = client.chat.completions.create(
-                model=config.TOGETHER_MODEL,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            # Don't print entire response object, only the content
-            result = response.choices[0].message.content.strip().upper() if response.choices else ""
+            # Imported on first use, as in market_data
+            import MetaTrader5 as mt5
+
+            if mt5_session.ensure_connected():
+                # Get positions with error handling
+                positions = mt5.positions_get(symbol=config.SYMBOL)
+                if positions is None:
+                    print(f"[RiskGuard] Failed to get positions. Error: {mt5.last_error()}")
+                    positions = ()
         except Exception as e:
-            print(f"[RiskGuard] Error getting LLM response: {e}")
-            # Default to not closing trades if API fails
-            result = "NO"
+            print(f"[RiskGuard] Error in MT5 operations: {e}")
 
-        # Parse decision - check if YES appears in the first few words
-        first_words = result.split()[:3]  # Check first 3 words
-        decision = any("YES" in word for word in first_words)
+        if answer is None and pending is None:
+            if positions:
+                pending = _submit_risk_llm()
+            else:
+                # Nothing open to close, so the recent decision still stands
+                decision = cached
 
-        # Initialize MT5 with proper error handling
-        try:
-            if not mt5.initialize():
-                print("[RiskGuard] MT5 failed to initialize!")
-                # Still return decision even if MT5 fails
-                return decision
-
-            login_result = mt5.login(config.MT5_ACCOUNT, password=config.MT5_PASSWORD, server=config.MT5_SERVER)
-            if not login_result:
-                print(f"[RiskGuard] MT5 login failed! Error code: {mt5.last_error()}")
-                mt5.shutdown()
-                return decision
-
-            # Get positions with error handling
-            positions = mt5.positions_get(symbol=config.SYMBOL)
-            if positions is None:
-                print(f"[RiskGuard] Failed to get positions. Error: {mt5.last_error()}")
-                positions = []
+        if pending is not None:
+            try:
+                answer = pending.result(timeout=RISK_CHECK_TIMEOUT_SECONDS)
+            except FuturesTimeoutError:
+                # No answer is not "no risk": skip this check rather than close or open trades
+                print(f"[RiskGuard] No risk answer after {RISK_CHECK_TIMEOUT_SECONDS}s - skipping this check")
+                return False, False
+            except Exception as e:
+                print(f"[RiskGuard] Error getting LLM response: {e}")
+                # Default to not closing trades if API fails (not remembered)
+                decision = False
+
+        # Parse decision
+        if decision is None:
+            decision = parse_risk_decision(answer)
+            _last_decision = (time.monotonic(), decision)
+
+        if positions is None:
+            # Still return decision even if MT5 fails
+            return decision, False
 
+        try:
             # Take action based on decision
             try:
                 if decision:
                     print("[RiskGuard] High risk detected — closing all trades.")
                     if positions:
+                        mutated = True
                         trade_executor.close_all_trades()
                 elif not positions:
+                    mutated = True
                     trade_executor.place_trade("BUY")
             except Exception as e:
                 print(f"[RiskGuard] Error executing trade action: {e}")
 
-            # Get updated positions after actions
-            positions = mt5.positions_get(symbol=config.SYMBOL) or []
+            # Get updated positions only if a trade action changed them
+            if mutated:
+                positions = mt5.positions_get(symbol=config.SYMBOL) or ()
                 
             # Gather trade stats
-            stats = []
-            for pos in positions:
-                trade_info = {
-                    'ticket': pos.ticket,
-                    'type': 'BUY' if pos.type == 0 else 'SELL',
-                    'volume': pos.volume,
-                    'price_open': pos.price_open,
-                    'profit': pos.profit,
-                    'time': pos.time,
-                }
-                stats.append(trade_info)            
+            stats = [TradeInfo(pos.ticket, 'BUY' if pos.type == 0 else 'SELL', pos.volume,
+                               pos.price_open, pos.profit, pos.time)
+                     for pos in positions]
         except Exception as e:
             print(f"[RiskGuard] Error in MT5 operations: {e}")
-        finally:
-            # Always attempt to close MT5 session, even if there were errors
-            try:
-                mt5.shutdown()
-            except Exception as e:
-                print(f"[RiskGuard] Error closing MT5 session: {e}")
 
-        # For bot.py compatibility, return boolean instead of dict
-        return decision
+        return decision, mutated
         
     except Exception as e:
         print(f"[RiskGuard] Unhandled error in check_news_risk: {e}")
-        return False  # Default to not closing trades on error
-
+        return False, mutated  # Default to not closing trades on error
@@ -1,10 +1,137 @@
 # signal_engine.py
 
-from together import Together
+import json
+import re
+import time
+from collections import defaultdict
 import config
+import llm_cache
+import llm_client
 
-# Initialize Together client
-client = Together(api_key=config.TOGETHER_API_KEY)
+# In-process verdict cache for near-identical market states
+SIGNAL_CACHE_TTL = getattr(config, 'SIGNAL_CACHE_TTL', 30)
+SIGNAL_CACHE_SIZE = 512
+_signal_cache = {}
+
+# A streamed single-symbol answer is cut off once it names a decision
+SIGNAL_MAX_TOKENS = getattr(config, 'SIGNAL_MAX_TOKENS', 16)
+
+# The first whole-word decision in an answer
+_DECISION_RE = re.compile(r"\b(BUY|SELL|NO\s*TRADE)\b", re.IGNORECASE)
+
+# Static prompt scaffolding, filled from the symbol_info dict
+_MARKET_TEMPLATE = """
+Current Market Data:
+- Symbol: {symbol}
+- Bid: {bid}
+- Ask: {ask}
+- Bid High: {bidhigh}
+- Bid Low: {bidlow}
+- Ask High: {askhigh}
+- Ask Low: {asklow}
+- Spread: {spread}
+- Time: {time}
+- Currency Base: {currency_base}
+- Currency Profit: {currency_profit}
+
+Account Data:
+- Balance: ${balance}
+- Equity: ${equity}
+- Margin: ${margin}
+- Free Margin: ${margin_free}
+- Margin Level: {margin_level}
+
+Profit Target Strategy:
+- Daily Profit Target: ${daily_profit_target}
+- Current Daily Profit: ${current_daily_profit}
+- Target Status: {target_status}
+"""
+
+# Prices are rounded to the symbol's digits and money to cents, so long float tails don't cost tokens
+_PRICE_FIELDS = ('bid', 'ask', 'bidhigh', 'bidlow', 'askhigh', 'asklow')
+_MONEY_FIELDS = ('balance', 'equity', 'margin', 'margin_free', 'margin_level',
+                 'daily_profit_target', 'current_daily_profit')
+
+_TRADE_LINE = "- Type: {type}, Volume: {volume}, Open Price: {price_open}, Current Profit: ${profit:.2f}\n"
+
+def _state_block(current_trades=None, symbol_info=None):
+    """Format the open positions and market data sections of a signal prompt"""
+    # Format open trades information
+    if current_trades:
+        trades_info = "\nCurrent Open Positions:\n" + "".join(_TRADE_LINE.format_map(trade) for trade in current_trades)
+    else:
+        trades_info = "\nCurrent Open Positions:\nNo open positions\n"
+    
+    # Format market data
+    if symbol_info:
+        fields = defaultdict(lambda: 'N/A', symbol_info)
+        digits = symbol_info.get('digits')
+        if isinstance(digits, int):
+            for key in _PRICE_FIELDS:
+                if isinstance(symbol_info.get(key), float):
+                    fields[key] = f"{symbol_info[key]:.{digits}f}"
+        for key in _MONEY_FIELDS:
+            if isinstance(symbol_info.get(key), float):
+                fields[key] = f"{symbol_info[key]:.2f}"
+        fields['target_status'] = 'ACHIEVED' if symbol_info.get('profit_target_achieved', False) else 'NOT YET ACHIEVED'
+        market_data = _MARKET_TEMPLATE.format_map(fields)
+    else:
+        market_data = "\nCurrent Market Data:\nMarket data not available\n"
+    
+    return f"{trades_info}\n{market_data}"
+
+def build_signal_prompt(current_trades=None, symbol_info=None):
+    """
+    Build the trade decision prompt from current market conditions and open trades.
+    
+    Args:
+        current_trades (list): List of dictionaries containing open trade information
+        symbol_info (dict): Current symbol price and other market information
+        
+    Returns:
+        str: The user prompt for the LLM
+    """
+    prompt = f"""Based on the following information, should I BUY or SELL EUR/USD now?
+{_state_block(current_trades, symbol_info)}
+
+Please analyze the data and respond with only one of these options: 'BUY', 'SELL', or 'NO TRADE'.
+Start your answer with that option, before any explanation.
+If I already have positions open in the direction you recommend, consider if adding more is wise."""
+    return prompt
+
+def _state_key(current_trades=None, symbol_info=None):
+    """Quantize the market state to instrument precision so repeat ticks share a key"""
+    info = symbol_info or {}
+    digits = info.get('digits') or 5
+
+    def price(value):
+        return round(value, digits) if isinstance(value, (int, float)) else value
+
+    trades = tuple(sorted((trade['type'], round(trade['price_open'], 5)) for trade in current_trades or ()))
+    return (info.get('symbol'), price(info.get('bid')), price(info.get('ask')), info.get('spread'),
+            bool(info.get('profit_target_achieved')), trades)
+
+def cached_signal(current_trades=None, symbol_info=None):
+    """Return the signal given for the same quantized state within SIGNAL_CACHE_TTL, or None"""
+    entry = _signal_cache.get(_state_key(current_trades, symbol_info))
+    if entry is not None and time.monotonic() - entry[0] < SIGNAL_CACHE_TTL:
+        return entry[1]
+    return None
+
+def remember_signal(current_trades, symbol_info, signal):
+    """Cache a signal for this quantized state"""
+    if len(_signal_cache) >= SIGNAL_CACHE_SIZE:
+        # Drop the oldest entry
+        del _signal_cache[next(iter(_signal_cache))]
+    _signal_cache[_state_key(current_trades, symbol_info)] = (time.monotonic(), signal)
+
+def parse_signal(result):
+    """Extract the trading decision (BUY, SELL, or NO TRADE) from an LLM answer"""
+    match = _DECISION_RE.search(result)
+    if match is None:
+        return "NO TRADE"
+    decision = match.group(1).upper()
+    return decision if decision in ("BUY", "SELL") else "NO TRADE"
 
 def get_trade_signal(current_trades=None, symbol_info=None):
     """
@@ -17,87 +144,122 @@ def get_trade_signal(current_trades=None, symbol_info=None):
     Returns:
         str: Trading decision (BUY, SELL, or NO TRADE)
     """
-    # Build detailed prompt with current trades and market data
-    if current_trades is None:
-        current_trades = []
-        
-    # Format open trades information
-    trades_info = "\nCurrent Open Positions:\n"
-    if current_trades:
-        for trade in current_trades:
-            trades_info += f"- Type: {trade['type']}, Volume: {trade['volume']}, Open Price: {trade['price_open']}, Current Profit: ${trade['profit']:.2f}\n"
-    else:
-        trades_info += "No open positions\n"
+    signal = cached_signal(current_trades, symbol_info)
+    if signal is not None:
+        return signal
+
+    result = _complete(build_signal_prompt(current_trades, symbol_info), early_exit=True)
     
-    # Format market data
-    market_data = "\nCurrent Market Data:\n"
-    if symbol_info:
-        # Symbol and price info
-        market_data += f"- Symbol: {symbol_info.get('symbol', 'N/A')}\n"
-        market_data += f"- Bid: {symbol_info.get('bid', 'N/A')}\n"
-        market_data += f"- Ask: {symbol_info.get('ask', 'N/A')}\n"
-        market_data += f"- Bid High: {symbol_info.get('bidhigh', 'N/A')}\n"
-        market_data += f"- Bid Low: {symbol_info.get('bidlow', 'N/A')}\n"
-        market_data += f"- Ask High: {symbol_info.get('askhigh', 'N/A')}\n"
-        market_data += f"- Ask Low: {symbol_info.get('asklow', 'N/A')}\n"
-        market_data += f"- Spread: {symbol_info.get('spread', 'N/A')}\n"
-        market_data += f"- Points: {symbol_info.get('points', 'N/A')}\n"
-        market_data += f"- Digits: {symbol_info.get('digits', 'N/A')}\n"
-        market_data += f"- Trade Contract Size: {symbol_info.get('trade_contract_size', 'N/A')}\n"
-        market_data += f"- Time: {symbol_info.get('time', 'N/A')}\n"
-        market_data += f"- Currency Base: {symbol_info.get('currency_base', 'N/A')}\n"
-        market_data += f"- Currency Profit: {symbol_info.get('currency_profit', 'N/A')}\n"
-        # Account info
-        market_data += f"- Balance: ${symbol_info.get('balance', 'N/A')}\n"
-        market_data += f"- Equity: ${symbol_info.get('equity', 'N/A')}\n"
-        market_data += f"- Margin: ${symbol_info.get('margin', 'N/A')}\n"
-        market_data += f"- Free Margin: ${symbol_info.get('margin_free', 'N/A')}\n"
-        market_data += f"- Margin Level: {symbol_info.get('margin_level', 'N/A')}\n"
-        market_data += f"- Trade Contract Size: {symbol_info.get('trade_contract_size', 'N/A')}\n"
-        market_data += f"- Time: {symbol_info.get('time', 'N/A')}\n"
-        market_data += f"- Currency Base: {symbol_info.get('currency_base', 'N/A')}\n"
-        market_data += f"- Currency Profit: {symbol_info.get('currency_profit', 'N/A')}\n"
-        
-        # Account statistics (no separate account_stats dict)
-        market_data += f"\nAccount Data:\n"
-        market_data += f"- Balance: ${symbol_info.get('balance', 'N/A')}\n"
-        market_data += f"- Equity: ${symbol_info.get('equity', 'N/A')}\n"
-        market_data += f"- Free Margin: ${symbol_info.get('margin_free', 'N/A')}\n"
+    # Extract the decision; an answer without one isn't cached as a NO TRADE verdict
+    signal = parse_signal(result)
+    if _DECISION_RE.search(result):
+        remember_signal(current_trades, symbol_info, signal)
+    return signal
+
+def get_trade_signals_batch(items):
+    """
+    Get trading signals for several symbols from a single LLM call.
+    
+    Args:
+        items (list): (current_trades, symbol_info) pairs, one per symbol
         
-        # Profit target strategy
-        market_data += f"\nProfit Target Strategy:\n"
-        market_data += f"- Daily Profit Target: ${symbol_info.get('daily_profit_target', 'N/A')}\n"
-        market_data += f"- Current Daily Profit: ${symbol_info.get('current_daily_profit', 'N/A')}\n"
-        target_achieved = symbol_info.get('profit_target_achieved', False)
-        market_data += f"- Target Status: {'ACHIEVED' if target_achieved else 'NOT YET ACHIEVED'}\n"
-    else:
-        market_data += "Market data not available\n"
+    Returns:
+        dict: Symbol -> trading decision (BUY, SELL, or NO TRADE)
+    """
+    signals = {}
+    pending = []
+    for current_trades, symbol_info in items:
+        symbol = (symbol_info or {}).get('symbol', config.SYMBOL)
+        signal = cached_signal(current_trades, symbol_info)
+        if signal is not None:
+            signals[symbol] = signal
+        else:
+            pending.append((symbol, current_trades, symbol_info))
     
-    # Create the prompt
-    prompt = f"""Based on the following information, should I BUY or SELL EUR/USD now?
-{trades_info}
-{market_data}
+    if len(pending) == 1:
+        # Nothing to batch with
+        symbol, current_trades, symbol_info = pending.pop()
+        signals[symbol] = get_trade_signal(current_trades, symbol_info)
+    
+    if pending:
+        blocks = "\n".join(
+            f"{i}) {symbol}\n{_state_block(current_trades, symbol_info)}"
+            for i, (symbol, current_trades, symbol_info) in enumerate(pending, start=1)
+        )
+        prompt = f"""Based on the following information, should I BUY or SELL each of these symbols now?
 
-Please analyze the data and respond with only one of these options: 'BUY', 'SELL', or 'NO TRADE'.
+{blocks}
+
+Please analyze the data and respond with only a JSON object mapping each symbol to one of 'BUY', 'SELL', or 'NO TRADE'.
 If I already have positions open in the direction you recommend, consider if adding more is wise."""
+        try:
+            result = _complete(prompt)
+            decisions = json.loads(result[result.index("{"):result.rindex("}") + 1])
+        except Exception as e:
+            print(f"[SignalEngine] Error getting batched signals: {e}")
+            decisions = {}
         
+        for symbol, current_trades, symbol_info in pending:
+            # The answer was upper-cased, keys included
+            answer = decisions.get(symbol.upper()) if isinstance(decisions, dict) else None
+            if isinstance(answer, str) and _DECISION_RE.search(answer):
+                signals[symbol] = parse_signal(answer)
+                remember_signal(current_trades, symbol_info, signals[symbol])
+            else:
+                # Ask for this symbol on its own
+                signals[symbol] = get_trade_signal(current_trades, symbol_info)
+    
+    return signals
+
+def _stream_decision(messages):
+    """Stream an answer and stop reading as soon as it contains a decision"""
+    stream = llm_client.get_client().chat.completions.create(
+        model=config.TOGETHER_MODEL,
+        messages=messages,
+        max_tokens=SIGNAL_MAX_TOKENS,
+        stream=True
+    )
+    result = ""
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                result += chunk.choices[0].delta.content.upper()
+                # Stop once a decision is followed by more text, so "BUY" isn't taken from "BUYER"
+                match = _DECISION_RE.search(result)
+                if match and match.end() < len(result):
+                    break
+    finally:
+        # Drop the connection instead of reading the rest of the answer
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return result
+
+def _complete(prompt, early_exit=False):
+    """Send a signal prompt with the configured system prompt and return the upper-cased answer.
+    
+    With early_exit the answer is streamed and cut off once it names a decision. If the
+    cut-off answer names none (e.g. a long preamble), it is asked again without the cap.
+    Answers without a decision are not cached.
+    """
     # Send to LLM with system prompt from config
     messages = [
         {"role": "system", "content": config.SYSTEM_PROMPT},
         {"role": "user", "content": prompt}
     ]
     
-    response = client.chat.completions.create(
-        model=config.TOGETHER_MODEL,
-        messages=messages
-    )
-    
-    result = response.choices[0].message.content.upper()
-    
-    # Extract the decision
-    if "BUY" in result:
-        return "BUY"
-    elif "SELL" in result:
-        return "SELL"
-    else:
-        return "NO TRADE"
+    # Identical market snapshots within the TTL reuse the previous answer
+    cache_key = llm_cache.make_key(config.TOGETHER_MODEL, config.SYSTEM_PROMPT, prompt)
+    result = llm_cache.get_cached(cache_key)
+    if result is None:
+        result = _stream_decision(messages) if early_exit else None
+        if result is None or not _DECISION_RE.search(result):
+            response = llm_client.get_client().chat.completions.create(
+                model=config.TOGETHER_MODEL,
+                messages=messages
+            )
+            
+            result = response.choices[0].message.content.upper()
+        if _DECISION_RE.search(result):
+            llm_cache.store(cache_key, result)
+    return result
@@ -2,10 +2,29 @@
 Timezone utility functions for the trading bot.
 Handles conversion between UTC and configured timezone.
 """
-import pytz
 from datetime import datetime
+from functools import lru_cache
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    import pytz
+    ZoneInfo = None
 import config
 
+@lru_cache(maxsize=None)
+def _get_tz(name):
+    """Resolve a timezone name once and reuse the tzinfo object"""
+    return ZoneInfo(name) if ZoneInfo is not None else pytz.timezone(name)
+
+def _localize(dt, tz):
+    """Attach tz to a naive datetime (pytz zones need localize() for the right offset)"""
+    localize = getattr(tz, 'localize', None)
+    return localize(dt) if localize is not None else dt.replace(tzinfo=tz)
+
+_UTC = _get_tz("UTC")
+# config.TIMEZONE is fixed for the life of the process
+_LOCAL_TZ = _get_tz(config.TIMEZONE)
+
 def convert_utc_to_local(utc_dt):
     """
     Convert a UTC datetime to the configured local timezone.
@@ -19,15 +38,14 @@ def convert_utc_to_local(utc_dt):
     if utc_dt is None:
         return None
         
-    # Ensure the datetime is timezone-aware UTC
+    # Naive datetimes are UTC; the cached tz objects are singletons, so identity is enough
     if utc_dt.tzinfo is None:
-        utc_dt = pytz.UTC.localize(utc_dt)
-    elif utc_dt.tzinfo != pytz.UTC:
-        utc_dt = utc_dt.astimezone(pytz.UTC)
+        utc_dt = utc_dt.replace(tzinfo=_UTC)
+    elif utc_dt.tzinfo is _LOCAL_TZ:
+        return utc_dt
     
-    # Convert to configured timezone
-    local_tz = pytz.timezone(config.TIMEZONE)
-    return utc_dt.astimezone(local_tz)
+    # Convert to configured timezone (astimezone handles any aware source zone)
+    return utc_dt.astimezone(_LOCAL_TZ)
 
 def convert_local_to_utc(local_dt):
     """
@@ -43,15 +61,13 @@ def convert_local_to_utc(local_dt):
         return None
         
     # If naive, assume it's in the configured timezone
-    local_tz = pytz.timezone(config.TIMEZONE)
     if local_dt.tzinfo is None:
-        local_dt = local_tz.localize(local_dt)
-    elif local_dt.tzinfo != local_tz:
-        # If it has a different timezone, convert it to the local timezone first
-        local_dt = local_dt.astimezone(local_tz)
+        local_dt = _localize(local_dt, _LOCAL_TZ)
+    elif local_dt.tzinfo is _UTC:
+        return local_dt
     
     # Convert to UTC
-    return local_dt.astimezone(pytz.UTC)
+    return local_dt.astimezone(_UTC)
 
 def get_current_local_time():
     """
@@ -60,9 +76,8 @@ def get_current_local_time():
     Returns:
         A datetime object representing the current time in the configured timezone
     """
-    now_utc = datetime.now(pytz.UTC)
-    local_tz = pytz.timezone(config.TIMEZONE)
-    return now_utc.astimezone(local_tz)
+    now_utc = datetime.now(_UTC)
+    return now_utc.astimezone(_LOCAL_TZ)
 
 def format_datetime(dt, format_str="%Y-%m-%d %H:%M:%S %Z"):
     """
@@ -80,8 +95,7 @@ def format_datetime(dt, format_str="%Y-%m-%d %H:%M:%S %Z"):
     
     # If the datetime is naive, assume it's in UTC
     if dt.tzinfo is None:
-        dt = pytz.UTC.localize(dt)
+        dt = dt.replace(tzinfo=_UTC)
     
-    # Always convert to local timezone for display
-    local_dt = convert_utc_to_local(dt)
-    return local_dt.strftime(format_str)
+    # Always convert to local timezone for display, in a single astimezone call
+    return dt.astimezone(_LOCAL_TZ).strftime(format_str)
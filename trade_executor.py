@@ -1,33 +1,76 @@
 # trade_executor.py
 
+from datetime import datetime
 import MetaTrader5 as mt5
 import config
-from db_config import SessionLocal
+from db_config import get_session
 import db_service
 
-def get_allowed_filling_mode(symbol):
-    """Get the first allowed filling mode for the specified symbol"""
-    # Default filling mode if we can't determine the allowed ones
-    default_mode = mt5.ORDER_FILLING_FOK  # Fill-or-Kill
+# symbol_info().filling_mode flag bits (SYMBOL_FILLING_FOK / SYMBOL_FILLING_IOC in MQL5).
+# They differ from the ORDER_FILLING_* values used in order requests.
+_SYMBOL_FILLING_FOK = 1
+_SYMBOL_FILLING_IOC = 2
+
+# Symbol metadata (filling flags, digits, contract size) per symbol, static for a session.
+# Only used for metadata; its bid/ask are stale by design.
+_symbol_info_cache = {}
+
+def _cached_symbol_info(symbol):
+    """mt5.symbol_info(symbol), fetched once per session (failures are not cached)"""
+    info = _symbol_info_cache.get(symbol)
+    if info is None:
+        info = mt5.symbol_info(symbol)
+        if info is not None:
+            _symbol_info_cache[symbol] = info
+    return info
+
+def _flush_symbol_info_cache():
+    """Forget cached symbol metadata and filling modes, e.g. after reconnecting"""
+    _symbol_info_cache.clear()
+    _filling_modes.clear()
+
+# Filling mode the broker last filled an order with, per symbol
+_filling_modes = {}
+
+def is_filled(result):
+    """True if an order_send result opened a position, fully or partially (IOC)"""
+    return result is not None and result.retcode in (
+        mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_DONE_PARTIAL)
+
+def _allowed_filling_modes(symbol):
+    """All filling modes the symbol allows, most likely to be accepted first.
     
-    # Get the filling mode flags
-    symbol_info = mt5.symbol_info(symbol)
+    Returns None if the symbol info can't be read.
+    """
+    symbol_info = _cached_symbol_info(symbol)
     if symbol_info is None:
-        print(f"Error: Failed to get symbol info for {symbol}, using default filling mode")
-        return default_mode
-        
+        return None
+    
     filling_flags = symbol_info.filling_mode
+    modes = []
+    # Immediate-or-Cancel accepts partial fills, so it is rejected least often
+    if filling_flags & _SYMBOL_FILLING_IOC:
+        modes.append(mt5.ORDER_FILLING_IOC)
+    if filling_flags & _SYMBOL_FILLING_FOK:
+        modes.append(mt5.ORDER_FILLING_FOK)  # Fill-or-Kill
+    # Return is always available outside market execution
+    modes.append(mt5.ORDER_FILLING_RETURN)
+    return modes
+
+def get_allowed_filling_mode(symbol):
+    """Get the preferred allowed filling mode for the specified symbol.
     
-    # Check available filling modes in order of preference
-    if filling_flags & mt5.ORDER_FILLING_FOK:
-        return mt5.ORDER_FILLING_FOK  # Fill-or-Kill
-    elif filling_flags & mt5.ORDER_FILLING_IOC:
-        return mt5.ORDER_FILLING_IOC  # Immediate-or-Cancel
-    elif filling_flags & mt5.ORDER_FILLING_RETURN:
-        return mt5.ORDER_FILLING_RETURN  # Return
-    else:
-        print(f"Warning: No recognized filling mode flags for {symbol}, using default")
-        return default_mode
+    A mode that has already filled an order wins; otherwise the first allowed one.
+    """
+    if symbol in _filling_modes:
+        return _filling_modes[symbol]
+    
+    modes = _allowed_filling_modes(symbol)
+    if modes is None:
+        # Default filling mode if we can't determine the allowed ones
+        print(f"Error: Failed to get symbol info for {symbol}, using default filling mode")
+        return mt5.ORDER_FILLING_FOK
+    return modes[0]
 
 def connect_mt5():
     if not mt5.initialize():
@@ -35,6 +78,8 @@ def connect_mt5():
     authorized = mt5.login(config.MT5_ACCOUNT, password=config.MT5_PASSWORD, server=config.MT5_SERVER)
     if not authorized:
         raise Exception("MT5 login failed")
+    # A new session may be on a different server with different symbol settings
+    _flush_symbol_info_cache()
 
 def place_trade(signal, lot_size=None):
     # Use provided lot_size or default to config.BASE_LOT
@@ -48,9 +93,13 @@ def place_trade(signal, lot_size=None):
         return None
         
     # Get current price
-    price = mt5.symbol_info_tick(symbol).ask if signal == "BUY" else mt5.symbol_info_tick(symbol).bid
+    tick = mt5.symbol_info_tick(symbol)
+    if tick is None:
+        print(f"Error: Failed to get tick for {symbol}: {mt5.last_error()}")
+        return None
+    price = tick.ask if signal == "BUY" else tick.bid
 
-    # Create a simplified market order request - don't specify filling mode at all
+    # Create a market order request with the symbol's preferred filling mode
     request = {
         "action": mt5.TRADE_ACTION_DEAL,
         "symbol": symbol,
@@ -61,23 +110,48 @@ def place_trade(signal, lot_size=None):
         "magic": 234000,
         "comment": "DeepSeekBot",
         "type_time": mt5.ORDER_TIME_GTC,
+        "type_filling": get_allowed_filling_mode(symbol),
     }
     result = mt5.order_send(request)
+    
+    # If the broker rejects the filling mode, try the symbol's other modes once each
+    if result is not None and result.retcode == mt5.TRADE_RETCODE_INVALID_FILL:
+        for mode in _allowed_filling_modes(symbol) or ():
+            if mode == request["type_filling"]:
+                continue
+            request["type_filling"] = mode
+            result = mt5.order_send(request)
+            if result is None or result.retcode != mt5.TRADE_RETCODE_INVALID_FILL:
+                break
+    
+    # Remember the mode only once the broker has filled an order with it
+    if is_filled(result):
+        _filling_modes[symbol] = request["type_filling"]
     return result
 
 def close_all_trades():
     positions = mt5.positions_get(symbol=config.SYMBOL)
+    if not positions:
+        return
+    
+    # One tick for the whole batch: longs close at the bid, shorts at the ask
+    tick = mt5.symbol_info_tick(config.SYMBOL)
+    if tick is None:
+        print(f"Error: Failed to get tick for {config.SYMBOL}: {mt5.last_error()}")
+        return
+    bid, ask = tick.bid, tick.ask
     
+    requests = []
     for pos in positions:
         if pos.type == 0:  # BUY
             close_type = mt5.ORDER_TYPE_SELL
-            price = mt5.symbol_info_tick(config.SYMBOL).bid
+            price = bid
         else:  # SELL
             close_type = mt5.ORDER_TYPE_BUY
-            price = mt5.symbol_info_tick(config.SYMBOL).ask
+            price = ask
             
         # Simplified request without specifying filling mode
-        request = {
+        requests.append({
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": config.SYMBOL,
             "volume": pos.volume,
@@ -88,16 +162,32 @@ def close_all_trades():
             "magic": 234000,
             "comment": "CloseRiskGuard",
             "type_time": mt5.ORDER_TIME_GTC,
+        })
+    
+    # Send sequentially: the MetaTrader5 module talks to one terminal and isn't thread-safe
+    results = [mt5.order_send(request) for request in requests]
+    
+    # Mark the closed trades in the database with one UPDATE
+    time_close = datetime.utcnow()
+    closed = [
+        {
+            "ticket": pos.ticket,
+            "price_close": request["price"],
+            "profit": pos.profit,
+            "time_close": time_close,
+            "is_active": False,
         }
-        result = mt5.order_send(request)
-        
-        # Update the database with the closed trade
-        if result and result.retcode == mt5.TRADE_RETCODE_DONE:
-            db = SessionLocal()
+        for pos, request, result in zip(positions, requests, results)
+        if result and result.retcode == mt5.TRADE_RETCODE_DONE
+    ]
+    if not closed:
+        return
+    try:
+        with get_session() as db:
             try:
-                # Update the trade in the database
-                db_service.close_trade(db, pos.ticket, price, pos.profit)
-            except Exception as e:
-                print(f"Error updating database for closed trade: {e}")
-            finally:
-                db.close()
+                db_service.update_trades_bulk(db, closed)
+            except Exception:
+                db.rollback()
+                raise
+    except Exception as e:
+        print(f"Error updating database for closed trades: {e}")
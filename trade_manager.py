@@ -3,108 +3,138 @@ Trade manager module for executing trades and managing trade operations.
 This module coordinates trade execution and signal processing.
 """
 import time
-import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import config
 import trade_executor
 import signal_engine
+import timezone_utils
 from data_manager import DataManager
 from market_data import MarketDataCollector
 
+# Longest a tick waits for the LLM signal before skipping trading for that tick
+SIGNAL_TIMEOUT_SECONDS = getattr(config, 'SIGNAL_TIMEOUT_SECONDS', 30)
+
+# Signals that place an order
+_TRADE_SIDES = frozenset(("BUY", "SELL"))
+
 class TradeManager:
     def __init__(self):
         """Initialize the trade manager"""
         self.data_manager = DataManager()
         self.market_data = MarketDataCollector()
+        # Runs the LLM signal request while the tick's other IO proceeds
+        self._signal_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="signal-llm")
+        # (date, amount invested that day); read from the database once per day
+        self._daily_invested = (None, 0.0)
     
-    def check_daily_limit(self):
+    def check_daily_limit(self, db=None, today=None):
         """Check if daily investment limit has been reached"""
-        today = datetime.date.today()
-        daily_invested = self.data_manager.get_daily_investment(today)
+        if today is None:
+            today = timezone_utils.get_current_local_time().date()
+        cached_day, daily_invested = self._daily_invested
+        if cached_day != today:
+            daily_invested = float(self.data_manager.get_daily_investment(today, db=db))
+            self._daily_invested = (today, daily_invested)
         
-        if daily_invested >= config.DAILY_INVESTMENT_LIMIT:
+        daily_limit = float(config.DAILY_INVESTMENT_LIMIT)
+        if daily_invested >= daily_limit:
             return True, 0.0
         
-        remaining_budget = config.DAILY_INVESTMENT_LIMIT - daily_invested
+        remaining_budget = daily_limit - daily_invested
         return False, remaining_budget
     
-    def process_trades(self):
-        """Process trades and return True if high risk is detected"""
-        # Get current positions from MT5
-        current_trades = self.market_data.get_positions_as_dict()
+    def gather_market_state(self):
+        """Collect the open trades and market data the trade signal is based on.
         
-        # Get current market data
-        symbol_info = self.market_data.get_symbol_info()
-        # symbol_info now includes: symbol, bid, ask, bidhigh, bidlow, askhigh, asklow, spread, points, digits, trade_contract_size, time, currency_base, currency_profit, balance, equity, margin, margin_free, margin_level
-        # symbol_info now includes: symbol, bid, ask, bidhigh, bidlow, askhigh, asklow, spread, points, digits, trade_contract_size, time, currency_base, currency_profit, balance, equity, margin, margin_free, margin_level
+        Returns:
+            tuple: (current_trades, symbol_info) as passed to signal_engine
+        """
+        # Get current positions from MT5 once, shared by both lookups below
+        positions = self.market_data.get_positions()
+        current_trades = self.market_data.get_positions_as_dict(positions=positions)
         
-        # Get trading signal
-        signal = signal_engine.get_trade_signal(current_trades, {
-            "symbol": symbol_info["symbol"],
-            "bid": symbol_info["bid"],
-            "ask": symbol_info["ask"],
-            "bidhigh": symbol_info["bidhigh"],
-            "bidlow": symbol_info["bidlow"],
-            "askhigh": symbol_info["askhigh"],
-            "asklow": symbol_info["asklow"],
-            "spread": symbol_info["spread"],
-            "points": symbol_info["points"],
-            "digits": symbol_info["digits"],
-            "trade_contract_size": symbol_info["trade_contract_size"],
-            "time": symbol_info["time"],
-            "currency_base": symbol_info["currency_base"],
-            "currency_profit": symbol_info["currency_profit"],
-            "balance": symbol_info["balance"],
-            "equity": symbol_info["equity"],
-            "margin": symbol_info["margin"],
-            "margin_free": symbol_info["margin_free"],
-            "margin_level": symbol_info["margin_level"]
-        })
+        # Get current market data; signal_engine reads the fields it needs with .get
+        symbol_info = self.market_data.get_symbol_info(positions=positions)
         
-        # Store signal in database
-        signal_id = self.data_manager.create_signal(
-            config.SYMBOL, 
-            signal, 
-            confidence=None,  # Could be added in future versions
-            reason=None  # Could be added in future versions
-        )
+        return current_trades, symbol_info
+    
+    def process_trades(self, market_state=None, signal=None):
+        """Process trades and return True if high risk is detected.
         
-        # If signal is to buy or sell, execute the trade
-        if signal in ["BUY", "SELL"]:
-            # Check if we're within daily investment limit
-            limit_reached, remaining_budget = self.check_daily_limit()
-            if limit_reached:
-                return False
-                
-            # Get currency price for lot calculation
-            currency_price = self.market_data.get_currency_price()
-            
-            # Calculate lot size based on remaining budget
-            lot_size = min(config.BASE_LOT, remaining_budget / (currency_price * 1000))
-                        
-            # Execute the trade
-            trade_result = trade_executor.place_trade(signal, lot_size)
-            
-            # Update daily investment tracker
-            today = datetime.date.today()
-            self.data_manager.update_daily_investment(today, lot_size * currency_price * 1000)
-            
-            # Mark signal as executed
-            self.data_manager.update_signal_executed(signal_id, True)
+        Args:
+            market_state (tuple): Result of gather_market_state(), collected here when None
+            signal (str): Trading decision if it was already obtained, asked here when None
+        """
+        if market_state is None:
+            market_state = self.gather_market_state()
+        
+        # Get trading signals, in the background if they still have to be asked.
+        # Every traded symbol goes through one batched request; today that is config.SYMBOL.
+        pending = self._signal_pool.submit(signal_engine.get_trade_signals_batch, [market_state]) if signal is None else None
+        
+        # One trading date for the whole tick, so the budget check and the write agree
+        today = timezone_utils.get_current_local_time().date()
+        
+        # Share one database session across this tick's reads and writes
+        with self.data_manager.session() as db:
+            executed = False
+            trade_data = None
+            investment = None
             
-            # If trade was executed successfully, store it in database
-            if trade_result and hasattr(trade_result, "order"):
-                trade_data = {
-                    "ticket": trade_result.order,
-                    "symbol": config.SYMBOL,
-                    "type": signal,
-                    "volume": lot_size,
-                    "price_open": trade_result.price,
-                    "profit": 0.0,  # Initial profit is 0
-                    "time": int(time.time()),
-                    "signal_id": signal_id
-                }
-                self.data_manager.create_trade(trade_data)
+            # Check if we're within daily investment limit while the signal is pending
+            limit_reached, remaining_budget = self.check_daily_limit(db=db, today=today)
+            if pending is not None:
+                try:
+                    signal = pending.result(timeout=SIGNAL_TIMEOUT_SECONDS).get(config.SYMBOL, "NO TRADE")
+                except FuturesTimeoutError:
+                    print(f"Trade signal not ready after {SIGNAL_TIMEOUT_SECONDS}s - skipping this tick")
+                    return False
+        
+            # If signal is to buy or sell, execute the trade
+            if signal in _TRADE_SIDES:
+                if not limit_reached:
+                    # Get currency price for lot calculation, from the prices already gathered
+                    symbol_info = market_state[1]
+                    if symbol_info.get('bid') and symbol_info.get('ask'):
+                        currency_price = (symbol_info['bid'] + symbol_info['ask']) / 2
+                    else:
+                        currency_price = self.market_data.get_currency_price()
+                
+                    # Calculate lot size based on remaining budget
+                    notional = currency_price * 1000.0
+                    lot_size = min(config.BASE_LOT, remaining_budget / notional)
+                            
+                    # Execute the trade before any database writes
+                    trade_result = trade_executor.place_trade(signal, lot_size)
+                
+                    # Only a filled order counts as executed and against the daily budget,
+                    # charged for the volume actually filled (IOC may fill partially)
+                    if trade_executor.is_filled(trade_result):
+                        executed = True
+                        filled_volume = trade_result.volume
+                        investment = filled_volume * notional
+                        # Count the live order against today's budget now, even if the write below fails
+                        day, invested = self._daily_invested
+                        self._daily_invested = (day, invested + investment)
+                        trade_data = {
+                            "ticket": trade_result.order,
+                            "symbol": config.SYMBOL,
+                            "type": signal,
+                            "volume": filled_volume,
+                            "price_open": trade_result.price,
+                            "profit": 0.0,  # Initial profit is 0
+                            "time": int(time.time())
+                        }
             
-            return False
-        else:
-            return False
\ No newline at end of file
+            # Store the signal, its trade and the investment with a single commit
+            self.data_manager.record_signal(
+                config.SYMBOL,
+                signal,
+                executed=executed,
+                trade_data=trade_data,
+                investment=investment,
+                investment_date=today,
+                db=db
+            )
+        
+        return False